@@ -0,0 +1,27 @@
+"""post claimed at
+
+Revision ID: 3f9a1c7d2b64
+Revises: aad6f851c40f
+Create Date: 2025-06-02 10:12:31.208114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2b64'
+down_revision: Union[str, None] = 'aad6f851c40f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('claimed_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.execute("UPDATE posts SET status = 'scheduled' WHERE status = 'sending'")
+    op.drop_column('posts', 'claimed_at')
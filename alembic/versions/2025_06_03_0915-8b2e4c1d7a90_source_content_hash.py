@@ -0,0 +1,28 @@
+"""source content hash
+
+Revision ID: 8b2e4c1d7a90
+Revises: 3f9a1c7d2b64
+Create Date: 2025-06-03 09:15:44.581230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4c1d7a90'
+down_revision: Union[str, None] = '3f9a1c7d2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sources', sa.Column('content_hash', sa.String(), nullable=True))
+    op.create_index(op.f('ix_sources_content_hash'), 'sources', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_sources_content_hash'), table_name='sources')
+    op.drop_column('sources', 'content_hash')
@@ -0,0 +1,77 @@
+"""scheduled ai post next run at
+
+Revision ID: c47d19e5f2a3
+Revises: 8b2e4c1d7a90
+Create Date: 2025-06-04 11:40:08.317529
+
+"""
+from datetime import datetime, time, timedelta, timezone
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import pytz
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d19e5f2a3'
+down_revision: Union[str, None] = '8b2e4c1d7a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+scheduled_ai_posts = sa.table(
+    'scheduled_ai_posts',
+    sa.column('id', sa.Integer),
+    sa.column('weekdays', postgresql.ARRAY(sa.Integer)),
+    sa.column('times', postgresql.ARRAY(sa.String)),
+    sa.column('timezone', sa.String),
+    sa.column('is_active', sa.Boolean),
+    sa.column('next_run_at', sa.DateTime(timezone=True)),
+)
+
+
+def next_run_at(weekdays, times, tz_name, after: datetime) -> Optional[datetime]:
+    # the schedule rules as of this revision, kept here so later model changes don't alter it
+    if not weekdays or not times:
+        return None
+    tz_info = pytz.timezone(tz_name or "UTC")
+    after_local = after.astimezone(tz_info)
+    slots = sorted(time.fromisoformat(value) for value in times)
+    for days in range(8):
+        day = after_local.date() + timedelta(days=days)
+        if day.weekday() not in weekdays:
+            continue
+        for slot in slots:
+            run_at = tz_info.localize(datetime.combine(day, slot))
+            if run_at > after_local:
+                return run_at.astimezone(pytz.utc)
+    return None
+
+
+def upgrade() -> None:
+    op.add_column('scheduled_ai_posts', sa.Column('next_run_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_scheduled_ai_posts_next_run_at'), 'scheduled_ai_posts', ['next_run_at'], unique=False)
+
+    # backfill from the schedules, so existing schedulers keep running
+    now = datetime.now(tz=timezone.utc)
+    rows = op.get_bind().execute(
+        sa.select(
+            scheduled_ai_posts.c.id,
+            scheduled_ai_posts.c.weekdays,
+            scheduled_ai_posts.c.times,
+            scheduled_ai_posts.c.timezone,
+        ).where(scheduled_ai_posts.c.is_active)
+    ).all()
+    for id_, weekdays, times, tz_name in rows:
+        op.execute(
+            scheduled_ai_posts.update()
+            .where(scheduled_ai_posts.c.id == id_)
+            .values(next_run_at=next_run_at(weekdays, times, tz_name, now))
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_scheduled_ai_posts_next_run_at'), table_name='scheduled_ai_posts')
+    op.drop_column('scheduled_ai_posts', 'next_run_at')
@@ -0,0 +1,61 @@
+"""hot path indexes
+
+Revision ID: 5e8a3f71c6d2
+Revises: c47d19e5f2a3
+Create Date: 2025-06-05 10:20:52.114906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a3f71c6d2'
+down_revision: Union[str, None] = 'c47d19e5f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns, partial index condition
+INDEXES = [
+    ('ix_posts_due', 'posts', ['scheduled_time'], "status = 'scheduled'"),
+    ('ix_posts_sending', 'posts', ['claimed_at'], "status = 'sending'"),
+    ('ix_posts_channel_id_created_at', 'posts', ['channel_id', 'created_at'], None),
+    ('ix_posts_company_id_created_at', 'posts', ['company_id', 'created_at'], None),
+    ('ix_channel_logs_channel_id_action_created_at', 'channel_logs', ['channel_id', 'action', 'created_at'], None),
+    ('ix_channel_logs_channel_id_created_at', 'channel_logs', ['channel_id', 'created_at'], None),
+    ('ix_channel_logs_created_at', 'channel_logs', ['created_at'], None),
+    ('ix_usages_company_id_action_type_created_at', 'usages', ['company_id', 'action_type', 'created_at'], None),
+    ('ix_auth_sessions_token', 'auth_sessions', ['token'], None),
+    ('ix_sources_channel_id_created_at', 'sources', ['channel_id', 'created_at'], None),
+    ('ix_sources_company_id', 'sources', ['company_id'], None),
+    ('ix_scheduled_ai_posts_due', 'scheduled_ai_posts', ['next_run_at'], "is_active"),
+    ('ix_scheduled_ai_posts_channel_id', 'scheduled_ai_posts', ['channel_id'], None),
+    ('ix_channels_company_id', 'channels', ['company_id'], None),
+]
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction and doesn't lock writes
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                unique=False,
+                postgresql_concurrently=True,
+                postgresql_where=sa.text(where) if where else None,
+                if_not_exists=True,
+            )
+        # superseded by the partial ix_scheduled_ai_posts_due
+        op.drop_index('ix_scheduled_ai_posts_next_run_at', table_name='scheduled_ai_posts', postgresql_concurrently=True, if_exists=True)
+    op.execute('ANALYZE posts, channel_logs, usages, auth_sessions, sources, scheduled_ai_posts, channels')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_scheduled_ai_posts_next_run_at', 'scheduled_ai_posts', ['next_run_at'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        for name, table, columns, where in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
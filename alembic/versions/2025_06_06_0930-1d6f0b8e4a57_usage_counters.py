@@ -0,0 +1,43 @@
+"""usage counters
+
+Revision ID: 1d6f0b8e4a57
+Revises: 5e8a3f71c6d2
+Create Date: 2025-06-06 09:30:17.642091
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1d6f0b8e4a57'
+down_revision: Union[str, None] = '5e8a3f71c6d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_counters',
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('period_start', sa.DateTime(), nullable=False),
+    sa.Column('action_type', sa.String(), nullable=False),
+    sa.Column('used', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('company_id', 'period_start', 'action_type')
+    )
+    # counters of the current period from the existing usages, same rules as the old COUNT(*)
+    op.execute("""
+        INSERT INTO usage_counters (company_id, period_start, action_type, used)
+        SELECT usages.company_id, companies.last_payment_at, usages.action_type, count(*)
+        FROM usages
+        JOIN companies ON companies.id = usages.company_id
+        WHERE companies.last_payment_at IS NOT NULL AND usages.created_at >= companies.last_payment_at
+        GROUP BY usages.company_id, companies.last_payment_at, usages.action_type
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('usage_counters')
@@ -0,0 +1,44 @@
+"""keyset pagination indexes
+
+Revision ID: a93c5e7d1b28
+Revises: 1d6f0b8e4a57
+Create Date: 2025-06-07 11:15:37.402816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a93c5e7d1b28'
+down_revision: Union[str, None] = '1d6f0b8e4a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name, table, columns, superseded index
+INDEXES = [
+    ('ix_posts_channel_id_created_at_id', 'posts', ['channel_id', 'created_at', 'id'], ('ix_posts_channel_id_created_at', ['channel_id', 'created_at'])),
+    ('ix_channel_logs_channel_id_created_at_id', 'channel_logs', ['channel_id', 'created_at', 'id'], ('ix_channel_logs_channel_id_created_at', ['channel_id', 'created_at'])),
+    ('ix_sources_channel_id_created_at_id', 'sources', ['channel_id', 'created_at', 'id'], ('ix_sources_channel_id_created_at', ['channel_id', 'created_at'])),
+    ('ix_channels_company_id_created_at_id', 'channels', ['company_id', 'created_at', 'id'], ('ix_channels_company_id', ['company_id'])),
+    ('ix_payments_company_id_created_at_id', 'payments', ['company_id', 'created_at', 'id'], None),
+]
+
+
+def upgrade() -> None:
+    # list endpoints order by (created_at, id) and seek with a row comparison on both
+    with op.get_context().autocommit_block():
+        for name, table, columns, superseded in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+            if superseded:
+                op.drop_index(superseded[0], table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.execute('ANALYZE posts, channel_logs, sources, channels, payments')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, superseded in reversed(INDEXES):
+            if superseded:
+                op.create_index(superseded[0], table, superseded[1], unique=False, postgresql_concurrently=True, if_not_exists=True)
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,113 @@
+"""partition channel_logs
+
+Revision ID: 6b1e9d4c2f70
+Revises: a93c5e7d1b28
+Create Date: 2025-06-08 08:45:12.583104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app import config
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b1e9d4c2f70'
+down_revision: Union[str, None] = 'a93c5e7d1b28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_channel_logs_channel_id_action_created_at', ['channel_id', 'action', 'created_at']),
+    ('ix_channel_logs_channel_id_created_at_id', ['channel_id', 'created_at', 'id']),
+    ('ix_channel_logs_created_at', ['created_at']),
+]
+
+COLUMNS = 'id, channel_id, post_id, message, action, created_at'
+
+
+def create_indexes() -> None:
+    for name, columns in INDEXES:
+        op.create_index(name, 'channel_logs', columns, unique=False)
+
+
+def upgrade() -> None:
+    # keep the old table aside, its index and constraint names are taken over by the new one
+    op.rename_table('channel_logs', 'channel_logs_old')
+    op.execute('ALTER TABLE channel_logs_old RENAME CONSTRAINT channel_logs_pkey TO channel_logs_old_pkey')
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='channel_logs_old', if_exists=True)
+    op.execute('ALTER SEQUENCE channel_logs_id_seq OWNED BY NONE')
+
+    op.execute("""
+        CREATE TABLE channel_logs (
+            id integer NOT NULL DEFAULT nextval('channel_logs_id_seq'),
+            channel_id integer NOT NULL REFERENCES channels (id) ON DELETE CASCADE,
+            post_id integer REFERENCES posts (id) ON DELETE CASCADE,
+            message varchar NOT NULL,
+            action varchar,
+            created_at timestamp without time zone NOT NULL DEFAULT now(),
+            CONSTRAINT channel_logs_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('ALTER SEQUENCE channel_logs_id_seq OWNED BY channel_logs.id')
+    create_indexes()
+
+    # one partition per day for the retention period and the days ahead. No default
+    # partition: it would keep partitions from being detached concurrently, and from
+    # being created for a day it holds rows of. remove_old_channel_logs keeps
+    # CHANNEL_LOGS_PARTITIONS_AHEAD days created in advance.
+    op.execute(f"""
+        DO $$
+        DECLARE
+            day date;
+        BEGIN
+            FOR day IN
+                SELECT generate_series(
+                    current_date - {config.CHANNEL_LOGS_RETENTION_DAYS},
+                    current_date + {config.CHANNEL_LOGS_PARTITIONS_AHEAD},
+                    interval '1 day'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF channel_logs FOR VALUES FROM (%L) TO (%L)',
+                    'channel_logs_p' || to_char(day, 'YYYYMMDD'), day, day + 1
+                );
+            END LOOP;
+        END $$
+    """)
+
+    # rows older than the retention period would be dropped by the next run anyway
+    op.execute(f"""
+        INSERT INTO channel_logs ({COLUMNS})
+        SELECT {COLUMNS} FROM channel_logs_old
+        WHERE created_at >= current_date - {config.CHANNEL_LOGS_RETENTION_DAYS}
+        AND created_at < current_date + {config.CHANNEL_LOGS_PARTITIONS_AHEAD + 1}
+    """)
+    op.drop_table('channel_logs_old')
+    op.execute('ANALYZE channel_logs')
+
+
+def downgrade() -> None:
+    op.rename_table('channel_logs', 'channel_logs_partitioned')
+    op.execute('ALTER TABLE channel_logs_partitioned RENAME CONSTRAINT channel_logs_pkey TO channel_logs_partitioned_pkey')
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name='channel_logs_partitioned', if_exists=True)
+    op.execute('ALTER SEQUENCE channel_logs_id_seq OWNED BY NONE')
+
+    op.execute("""
+        CREATE TABLE channel_logs (
+            id integer NOT NULL DEFAULT nextval('channel_logs_id_seq'),
+            channel_id integer NOT NULL REFERENCES channels (id) ON DELETE CASCADE,
+            post_id integer REFERENCES posts (id) ON DELETE CASCADE,
+            message varchar NOT NULL,
+            action varchar,
+            created_at timestamp without time zone NOT NULL DEFAULT now(),
+            CONSTRAINT channel_logs_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute('ALTER SEQUENCE channel_logs_id_seq OWNED BY channel_logs.id')
+    op.execute(f'INSERT INTO channel_logs ({COLUMNS}) SELECT {COLUMNS} FROM channel_logs_partitioned')
+    op.drop_table('channel_logs_partitioned')
+    create_indexes()
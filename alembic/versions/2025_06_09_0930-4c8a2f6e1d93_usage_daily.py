@@ -0,0 +1,34 @@
+"""usage daily
+
+Revision ID: 4c8a2f6e1d93
+Revises: 6b1e9d4c2f70
+Create Date: 2025-06-09 09:30:41.217356
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8a2f6e1d93'
+down_revision: Union[str, None] = '6b1e9d4c2f70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('usage_daily',
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('action_type', sa.String(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('company_id', 'action_type', 'day')
+    )
+
+
+def downgrade() -> None:
+    # raw usages already rolled up are not restored
+    op.drop_table('usage_daily')
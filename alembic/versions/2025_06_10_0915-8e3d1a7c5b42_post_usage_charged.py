@@ -0,0 +1,29 @@
+"""post usage charged
+
+Revision ID: 8e3d1a7c5b42
+Revises: 4c8a2f6e1d93
+Create Date: 2025-06-10 09:15:26.904518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e3d1a7c5b42'
+down_revision: Union[str, None] = '4c8a2f6e1d93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('posts', sa.Column('usage_charged', sa.Boolean(), server_default='false', nullable=False))
+    # posts in flight were charged by the dispatcher that claimed them, published ones
+    # used their charge up and are charged again when sent again
+    op.execute("UPDATE posts SET usage_charged = true WHERE status = 'sending'")
+
+
+def downgrade() -> None:
+    op.drop_column('posts', 'usage_charged')
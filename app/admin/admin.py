@@ -11,6 +11,7 @@ from app.users import queries as user_queries
 from starlette.responses import RedirectResponse
 from app.auth import auth as auth_tools
 from app.auth import queries as auth_queries
+from app.auth.cache import get_auth_snapshot
 
 
 class AdminAuth(AuthenticationBackend):
@@ -67,7 +68,7 @@ class AdminAuth(AuthenticationBackend):
             if token_session is None:
                 return False
             async with async_session_maker() as db_session:
-                auth_session = await auth_queries.get_auth_session(token_session, db_session)
+                auth_session = await get_auth_snapshot(token_session, db_session)
                 print(f"Auth session found: {auth_session}")
                 if not auth_session:
                     return False
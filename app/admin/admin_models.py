@@ -1,10 +1,16 @@
+from datetime import datetime, timezone
+
 from sqladmin import ModelView
+from app.ai import queries as ai_queries
+from app.users import queries as user_queries
+from app.auth import cache as auth_cache
 from app.users.models import User, UserSetting, Company
 from app.auth.models import AuthSession
 from app.channels.models import Channel, ChannelLog
 from app.posts.models import Post
 from app.ai.models import Source, AIConfig, ScheduledAIPost
 from app.billing.models import Plan, Usage, Referral, Payment
+from app.database import async_session_maker
 
 
 class AdminModelView(ModelView):
@@ -13,6 +19,9 @@ class AdminModelView(ModelView):
 
 
 class UserAdmin(AdminModelView, model=User):
+    async def after_model_change(self, data, model, is_created, request):
+        await auth_cache.invalidate_user(model.id)
+
     column_list = [
         User.id,
         User.email,
@@ -35,6 +44,9 @@ class AuthSessionAdmin(AdminModelView, model=AuthSession):
 
 
 class CompanyAdmin(AdminModelView, model=Company):
+    async def after_model_change(self, data, model, is_created, request):
+        await auth_cache.invalidate_companies([model.id])
+
     column_list = [
         Company.id,
         Company.name,
@@ -93,6 +105,15 @@ class AIConfigAdmin(AdminModelView, model=AIConfig):
 
 
 class ScheduledAIPostAdmin(AdminModelView, model=ScheduledAIPost):
+    async def after_model_change(self, data, model, is_created, request):
+        # the due schedulers query reads next_run_at, keep it in line with the edited schedule
+        async with async_session_maker() as session:
+            await ai_queries.update_scheduled_ai_posts_query(
+                ids=[model.id],
+                data={"next_run_at": model.get_next_run_at(datetime.now(tz=timezone.utc))},
+                session=session,
+            )
+
     column_list = [
         ScheduledAIPost.id,
         ScheduledAIPost.channel_id,
@@ -106,6 +127,12 @@ class ScheduledAIPostAdmin(AdminModelView, model=ScheduledAIPost):
 
 
 class PlanAdmin(AdminModelView, model=Plan):
+    async def after_model_change(self, data, model, is_created, request):
+        # cached auth snapshots hold the plan and its limits
+        async with async_session_maker() as session:
+            company_ids = await user_queries.get_company_ids_by_plan_query(model.id, session)
+        await auth_cache.invalidate_companies(company_ids)
+
     column_list = [
         Plan.id,
         Plan.name,
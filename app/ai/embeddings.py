@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import random
+import re
+import unicodedata
+from array import array
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Optional
+
+import tiktoken
+from celery.utils.log import get_task_logger
+from langchain_huggingface import HuggingFaceEndpointEmbeddings
+from langchain_openai import OpenAIEmbeddings
+
+from app import config
+from app.cache import RedisLRUCache, TTLCache
+
+logger = get_task_logger(__name__)
+
+
+def create_embedding_model():
+    if config.EMBEDDING_SERVICE == "huggingface":
+        return HuggingFaceEndpointEmbeddings(
+            huggingfacehub_api_token=config.HUGGINGFACE_API_KEY,
+            task="feature-extraction",
+            model=config.HUGGINGFACE_EMBEDDING_MODEL
+        )
+    if config.EMBEDDING_SERVICE == "openai":
+        return OpenAIEmbeddings(
+            api_key=config.OPENAI_API_KEY,
+            model=config.OPENAI_EMBEDDING_MODEL,
+            dimensions=768,
+            max_retries=0,  # retried by AsyncEmbedder, with jitter
+        )
+    raise ValueError(f"Unsupported embedding service: {config.EMBEDDING_SERVICE}")
+
+
+def embedding_model_id() -> str:
+    if config.EMBEDDING_SERVICE == "openai":
+        return f"openai:{config.OPENAI_EMBEDDING_MODEL}:768"
+    return f"{config.EMBEDDING_SERVICE}:{config.HUGGINGFACE_EMBEDDING_MODEL}"
+
+
+embedding_model = create_embedding_model()
+
+embedding_cache = RedisLRUCache(
+    namespace="emb",
+    max_entries=config.EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl=config.EMBEDDING_CACHE_TTL,
+)
+
+
+# queries get their own namespace, some models embed queries and documents differently
+query_embedding_cache = RedisLRUCache(
+    namespace="qemb",
+    max_entries=config.QUERY_EMBEDDING_CACHE_MAX_ENTRIES,
+    ttl=config.QUERY_EMBEDDING_CACHE_TTL,
+)
+_local_query_embeddings = TTLCache(
+    max_size=config.QUERY_EMBEDDING_LOCAL_CACHE_SIZE,
+    ttl=config.QUERY_EMBEDDING_CACHE_TTL,
+)
+
+
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def embedding_cache_key(text: str, model_id: str = None) -> str:
+    """
+    Content address of a chunk: the same text embedded by the same model and
+    dimensions always gets the same key, whatever channel or document it came from.
+    """
+    payload = f"{model_id or embedding_model_id()}\n{normalize_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def pack_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def unpack_vector(data: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(data)
+    return vector.tolist()
+
+
+async def embed_query(text: str) -> List[float]:
+    """
+    Embedding of a search query, from process memory, then Redis, then the provider.
+    Keyed like the chunk cache by normalized text and model, so the API and the
+    workers share entries.
+    """
+    key = embedding_cache_key(text)
+    vector = _local_query_embeddings.get(key)
+    if vector is not None:
+        return vector
+
+    try:
+        data = await query_embedding_cache.get(key)
+    except Exception as e:
+        logger.warning(f"Query embedding cache unavailable: {e}")
+        data = None
+    if data is not None:
+        vector = unpack_vector(data)
+    else:
+        vector = await embedding_model.aembed_query(normalize_text(text))
+        try:
+            await query_embedding_cache.set(key, pack_vector(vector))
+        except Exception as e:
+            logger.warning(f"Query embedding cache unavailable: {e}")
+    _local_query_embeddings.set(key, vector)
+    return vector
+
+
+def get_encoding() -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(config.OPENAI_EMBEDDING_MODEL)
+    except KeyError:
+        # huggingface models have their own tokenizers, cl100k is close enough for sizing batches
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    # openai errors have `status_code`, httpx/requests errors a `response`, aiohttp errors `status`
+    response = getattr(error, "response", None)
+    for status in (
+        getattr(error, "status_code", None),
+        getattr(response, "status_code", None),
+        getattr(error, "status", None),
+    ):
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ClientConnectionError"):
+        return True
+    status = _status_code(error)
+    return status is not None and (status == 429 or status >= 500)
+
+
+class AsyncEmbedder:
+    """
+    Embeds batches of texts with at most EMBEDDING_MAX_IN_FLIGHT requests in flight.
+    Batches are sized by chunk count and by token count. Rate limits and server errors
+    are retried with exponential backoff and full jitter. Texts found in the embedding
+    cache are not sent to the provider.
+    """
+
+    def __init__(self, model=None, max_in_flight: int = None, cache: Optional[RedisLRUCache] = embedding_cache):
+        self.model = model or embedding_model
+        self.model_id = embedding_model_id()
+        self.max_in_flight = max_in_flight or config.EMBEDDING_MAX_IN_FLIGHT
+        self.semaphore = asyncio.Semaphore(self.max_in_flight)
+        self.encoding = get_encoding()
+        self.cache = cache
+        self.retries = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else 0.0
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def iter_batches(self, items: Iterable, key: Callable = lambda item: item) -> Iterator[list]:
+        """
+        Group items into batches of at most EMBEDDING_BATCH_SIZE items and
+        EMBEDDING_BATCH_MAX_TOKENS tokens. An item over the token limit gets a batch of its own.
+        """
+        batch, tokens = [], 0
+        for item in items:
+            item_tokens = self.count_tokens(key(item))
+            if batch and (
+                len(batch) >= config.EMBEDDING_BATCH_SIZE
+                or tokens + item_tokens > config.EMBEDDING_BATCH_MAX_TOKENS
+            ):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += item_tokens
+        if batch:
+            yield batch
+
+    async def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return await self.request(texts)
+
+        keys = [embedding_cache_key(text, self.model_id) for text in texts]
+        try:
+            cached = await self.cache.get_many(keys)
+        except Exception as e:
+            logger.warning(f"Embedding cache unavailable: {e}")
+            cached = [None] * len(keys)
+        missing = [i for i, value in enumerate(cached) if value is None]
+        self.cache_hits += len(keys) - len(missing)
+        self.cache_misses += len(missing)
+
+        embeddings = [unpack_vector(value) if value is not None else None for value in cached]
+        if missing:
+            fresh = await self.request([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+            try:
+                await self.cache.set_many({keys[i]: pack_vector(embedding) for i, embedding in zip(missing, fresh)})
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable: {e}")
+        return embeddings
+
+    async def request(self, texts: List[str]) -> List[List[float]]:
+        async with self.semaphore:
+            attempt = 0
+            while True:
+                try:
+                    return await self.model.aembed_documents(texts)
+                except Exception as e:
+                    if attempt >= config.EMBEDDING_MAX_RETRIES or not is_retryable(e):
+                        raise
+                    delay = random.uniform(0, min(config.EMBEDDING_RETRY_MAX_DELAY, config.EMBEDDING_RETRY_BASE_DELAY * 2 ** attempt))
+                    delay = max(delay, _retry_after(e) or 0)
+                    attempt += 1
+                    self.retries += 1
+                    logger.warning(f"Embedding request failed ({e}), retry {attempt} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+
+    async def embed_stream(self, batches: asyncio.Queue, out: asyncio.Queue, key: Callable = lambda item: item):
+        """
+        Read batches from `batches` until None and put (batch, embeddings) pairs to `out`
+        in the original order. Up to `max_in_flight` batches are embedded at once; a full
+        `out` queue stops reading, so slow consumers hold the producers back.
+        """
+        pending = deque()
+        try:
+            while (batch := await batches.get()) is not None:
+                texts = [key(item) for item in batch]
+                pending.append((batch, asyncio.ensure_future(self.embed_batch(texts))))
+                if len(pending) >= self.max_in_flight:
+                    batch, task = pending.popleft()
+                    await out.put((batch, await task))
+            while pending:
+                batch, task = pending.popleft()
+                await out.put((batch, await task))
+        finally:
+            for _, task in pending:
+                task.cancel()
+        await out.put(None)
@@ -1,31 +1,16 @@
-from typing import TypedDict, Dict, Any
-from elasticsearch import Elasticsearch
+import asyncio
+import time
+from typing import TypedDict, Dict, Any, AsyncIterator, List, Union
 from langchain_core.messages import SystemMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_elasticsearch import ElasticsearchStore
-from langchain_openai import OpenAIEmbeddings
-from langchain_huggingface import HuggingFaceEmbeddings, HuggingFaceEndpointEmbeddings
-from openai import embeddings
 
 from app import config
+from app.ai.embeddings import embed_query
+from app.ai.response_cache import cache_response, get_cached_response, total_tokens
+from app.elastic import get_es
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph
 
-if config.EMBEDDING_SERVICE == "huggingface":
-    embedding_model = HuggingFaceEndpointEmbeddings(
-        huggingfacehub_api_token=config.HUGGINGFACE_API_KEY,
-        task="feature-extraction",
-        model=config.HUGGINGFACE_EMBEDDING_MODEL
-    )
-elif config.EMBEDDING_SERVICE == "openai":
-    embedding_model = OpenAIEmbeddings(
-        api_key=config.OPENAI_API_KEY,
-        model=config.OPENAI_EMBEDDING_MODEL,
-        dimensions=768,
-    )
-else:
-    raise ValueError(f"Unsupported embedding service: {config.EMBEDDING_SERVICE}")
-
 
 model = ChatOpenAI(
     temperature=0,
@@ -34,14 +19,7 @@ model = ChatOpenAI(
     max_tokens=config.MAX_TOKEN_LIMIT,
 )
 
-es = Elasticsearch(config.ELASTICSEARCH_HOST)
-
-vectorstore = ElasticsearchStore(
-    index_name="documents",
-    es_connection=es,
-    embedding=embedding_model,
-    vector_query_field="embedding",
-)
+INDEX_NAME = "documents"
 
 tools = []
 
@@ -50,44 +28,93 @@ class State(TypedDict):
     additional_kwargs: Dict[str, Any]
 
 
-def retriever_node(state):
+def random_documents_body(channel_id: int, company_id: int, size: int = 3) -> dict:
+    return {
+        "query": {
+            "function_score": {
+                "query": {
+                    "bool": {
+                        "must": [
+                            {"term": {"channel_id": channel_id}},
+                            {"term": {"company_id": company_id}},
+                        ]
+                    }
+                },
+                "random_score": {},
+            }
+        },
+        "size": size,
+    }
+
+
+async def search_random_documents(channel_id: int, company_id: int, size: int = 3) -> list:
+    response = await get_es().search(index=INDEX_NAME, **random_documents_body(channel_id, company_id, size))
+    return response["hits"]["hits"]
+
+
+async def search_random_documents_many(channels: List[tuple], size: int = 3) -> List[list]:
+    """
+    Random document hits for many (channel_id, company_id) pairs in one multi-search
+    request. A search that failed on its own gets no documents.
+    """
+    searches = []
+    for channel_id, company_id in channels:
+        searches.append({"index": INDEX_NAME})
+        searches.append(random_documents_body(channel_id, company_id, size))
+    response = await get_es().msearch(searches=searches)
+    return [item.get("hits", {}).get("hits", []) for item in response["responses"]]
+
+
+async def search_similar_documents(query_vector: List[float], channel_id: int, company_id: int, k: int = 3) -> list:
+    """
+    kNN search on the chunk embeddings, the same query ElasticsearchStore.similarity_search
+    sends, but on the async client.
+    """
+    response = await get_es().search(
+        index=INDEX_NAME,
+        knn={
+            "field": "embedding",
+            "query_vector": query_vector,
+            "k": k,
+            "num_candidates": config.ES_KNN_NUM_CANDIDATES,
+            "filter": [{"term": {"channel_id": channel_id}}, {"term": {"company_id": company_id}}],
+        },
+        size=k,
+        source_excludes=["embedding"],
+    )
+    return response["hits"]["hits"]
+
+
+def set_context(state, hits: list):
+    # the chunk ids are part of the response cache key
+    state["additional_kwargs"]["context"] = "\n\n".join([hit["_source"]["text"] for hit in hits])
+    state["additional_kwargs"]["document_ids"] = [hit["_id"] for hit in hits]
+
+
+async def retriever_node(state):
     topic = state["additional_kwargs"].get("topic", "No topic")
     channel_id = state["additional_kwargs"]["channel_id"]
     company_id = state["additional_kwargs"]["company_id"]
+    # seconds spent embedding the topic and searching, apart
+    timings = state["additional_kwargs"]["timings"] = {"embed": 0.0, "search": 0.0}
     if "random" in state["additional_kwargs"] and state["additional_kwargs"]["random"]:
-        docs = es.search(
-            index="documents",
-            body={
-                "query": {
-                    "function_score": {
-                        "query": {
-                            "bool": {
-                                "must": [
-                                    {"term": {"channel_id": channel_id}},
-                                    {"term": {"company_id": company_id}},
-                                ]
-                            }
-                        },
-                        "random_score": {},
-                    }
-                },
-                "size": 3,
-            },
-        )
-        docs = [doc["_source"] for doc in docs["hits"]["hits"]]
-        print(f"{len(docs)} random documents found for topic '{topic}' in channel '{channel_id}' and company '{company_id}'")
-        print(docs)
-        context = "\n\n".join([doc["text"] for doc in docs])
+        start = time.perf_counter()
+        hits = await search_random_documents(channel_id, company_id)
+        timings["search"] = time.perf_counter() - start
+        print(f"{len(hits)} random documents found for topic '{topic}' in channel '{channel_id}' and company '{company_id}'")
     else:
-        docs = vectorstore.similarity_search(
-            query=topic,
-            k=3,
-            filter=[{"term": {"channel_id": channel_id}}, {"term": {"company_id": company_id}}],
+        start = time.perf_counter()
+        query_vector = await embed_query(topic)
+        timings["embed"] = time.perf_counter() - start
+        state["additional_kwargs"]["topic_embedding"] = query_vector  # for the semantic response cache
+        start = time.perf_counter()
+        hits = await search_similar_documents(query_vector, channel_id, company_id)
+        timings["search"] = time.perf_counter() - start
+        print(
+            f"Found {len(hits)} documents for topic '{topic}' in channel '{channel_id}' and company '{company_id}' "
+            f"(embedding {timings['embed'] * 1000:.0f} ms, search {timings['search'] * 1000:.0f} ms)"
         )
-        print(f"Found {len(docs)} documents for topic '{topic}' in channel '{channel_id}' and company '{company_id}'")
-        print(docs)
-        context = "\n\n".join([doc.page_content for doc in docs])
-    state["additional_kwargs"]["context"] = context
+    set_context(state, hits)
     return state
 
 
@@ -95,6 +122,7 @@ def prompt_builder(state):
     prompt = state["additional_kwargs"]["prompt"]
     topic = state["additional_kwargs"].get("topic", None)
     context = state["additional_kwargs"].get("context", None)
+    state["additional_kwargs"]["base_prompt"] = prompt
 
     if topic:
         prompt = f"{prompt}\n\nTopic: {topic}"
@@ -103,16 +131,91 @@ def prompt_builder(state):
     state["additional_kwargs"]["prompt"] = prompt
     return state
 
-def llm_generator(state):
+def build_messages(prompt: str) -> list:
+    return [SystemMessage(content="You are a helpful assistant."), HumanMessage(content=prompt)]
+
+async def llm_generator(state):
     prompt = state["additional_kwargs"]["prompt"]
-    response = model([SystemMessage(content="You are a helpful assistant."), HumanMessage(content=prompt)])
+    cached = await get_cached_response(state, model)
+    if cached is not None:
+        state["additional_kwargs"]["response"] = cached
+        return state
+    response = await model.ainvoke(build_messages(prompt))
     state["additional_kwargs"]["response"] = response.content
+    await cache_response(state, model, response.content, total_tokens(response))
     return state
 
 def post_editor(state):
     return state
 
 
+async def generate_posts(states: List[dict], max_concurrency: int = None) -> List[Union[dict, Exception]]:
+    """
+    The PostGraph steps for many inputs at once: random retrievals go to Elasticsearch
+    in one multi-search, the model calls through `abatch` with at most `max_concurrency`
+    (SCHEDULED_AI_LLM_CONCURRENCY) in flight. Returns the final state of every input,
+    or the exception its model call raised.
+    """
+    random_states = [state for state in states if state["additional_kwargs"].get("random")]
+    if random_states:
+        documents = await search_random_documents_many([
+            (state["additional_kwargs"]["channel_id"], state["additional_kwargs"]["company_id"])
+            for state in random_states
+        ])
+        for state, hits in zip(random_states, documents):
+            set_context(state, hits)
+    await asyncio.gather(*(
+        retriever_node(state) for state in states if not state["additional_kwargs"].get("random")
+    ))
+
+    states = [prompt_builder(state) for state in states]
+    cached = await asyncio.gather(*(get_cached_response(state, model) for state in states))
+    for state, response in zip(states, cached):
+        if response is not None:
+            state["additional_kwargs"]["response"] = response
+
+    missing = [state for state, response in zip(states, cached) if response is None]
+    responses = await model.abatch(
+        [build_messages(state["additional_kwargs"]["prompt"]) for state in missing],
+        config={"max_concurrency": max_concurrency or config.SCHEDULED_AI_LLM_CONCURRENCY},
+        return_exceptions=True,
+    ) if missing else []
+    errors = {}
+    for state, response in zip(missing, responses):
+        if isinstance(response, Exception):
+            errors[id(state)] = response
+            continue
+        state["additional_kwargs"]["response"] = response.content
+        await cache_response(state, model, response.content, total_tokens(response))
+    return [errors.get(id(state)) or post_editor(state) for state in states]
+
+
+async def stream_post(state) -> AsyncIterator[str]:
+    """
+    The PostGraph steps with the model output streamed: yields the text as the model
+    produces it and leaves the whole of it in state["additional_kwargs"]["response"].
+    """
+    state = await retriever_node(state)
+    state = prompt_builder(state)
+    cached = await get_cached_response(state, model)
+    if cached is not None:
+        state["additional_kwargs"]["response"] = cached
+        yield cached
+        post_editor(state)
+        return
+
+    chunks = []
+    tokens = 0
+    async for chunk in model.astream(build_messages(state["additional_kwargs"]["prompt"])):
+        tokens += total_tokens(chunk)  # only reported with stream_usage
+        if chunk.content:
+            chunks.append(chunk.content)
+            yield chunk.content
+    state["additional_kwargs"]["response"] = "".join(chunks)
+    await cache_response(state, model, state["additional_kwargs"]["response"], tokens)
+    post_editor(state)
+
+
 class PostGraph:
 
     def __init__(self):
@@ -0,0 +1,136 @@
+"""
+Throughput of PostGraph generations against concurrency, on one event loop.
+
+    python -m app.ai.graph_benchmark --channel-id ID --company-id ID [--concurrency 1,8,32] [--runs N] [--random] [--batch]
+
+For every concurrency level `runs` generations (default: 2 x the level) go through the
+compiled graph with at most that many in flight, against the configured Elasticsearch,
+embedding provider and OpenAI model, so each run spends real tokens. Alongside the
+throughput come the retriever's median embedding and search times, apart, and the
+largest event loop lag: a node that blocks the loop shows up there and keeps the
+throughput flat as concurrency grows. --batch sends every level through
+generate_posts, the path of the scheduled batch tasks, with the level as its model call cap.
+
+Responses served from the LLM response cache count as generations too, run with
+LLM_CACHE_ENABLED=0 to measure the model alone.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Dict, List
+
+from app.ai.graph import PostGraph, generate_posts
+from app.ai.response_cache import response_cache
+from app.cache import close_redis
+from app.elastic import close_es
+
+PROMPT = "Write a short post for a Telegram channel."
+
+
+async def measure_lag(lags: List[float], interval: float = 0.05):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run_level(graph, concurrency: int, runs: int, args) -> Dict[str, float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    timings = []  # retriever embedding and search seconds per generation
+    errors = 0
+
+    def input_values(i: int) -> dict:
+        return {
+            "additional_kwargs": {
+                "prompt": PROMPT,
+                "channel_id": args.channel_id,
+                "company_id": args.company_id,
+                "topic": None if args.random else f"{args.topic} #{i}",
+                "random": args.random,
+            }
+        }
+
+    async def generate(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await graph.ainvoke(input_values(i))
+                latencies.append(time.perf_counter() - start)
+                timings.append(result["additional_kwargs"].get("timings"))
+            except Exception as e:
+                errors += 1
+                print(f"generation {i}: {e!r}")
+
+    lags = []
+    ticker = asyncio.ensure_future(measure_lag(lags))
+    start = time.perf_counter()
+    try:
+        if args.batch:
+            results = await generate_posts([input_values(i) for i in range(runs)], max_concurrency=concurrency)
+            errors = sum(isinstance(result, Exception) for result in results)
+            timings = [result["additional_kwargs"].get("timings") for result in results if isinstance(result, dict)]
+        else:
+            await asyncio.gather(*(generate(i) for i in range(runs)))
+    finally:
+        ticker.cancel()
+    elapsed = time.perf_counter() - start
+    if args.batch:
+        # one call for the whole level, there is no latency per generation
+        latencies = [elapsed] * (runs - errors)
+
+    latencies.sort()
+    # random retrievals of --batch go through one multi-search and have no timings
+    timings = [timing for timing in timings if timing]
+    return {
+        "embed": statistics.median(timing["embed"] for timing in timings) if timings else 0.0,
+        "search": statistics.median(timing["search"] for timing in timings) if timings else 0.0,
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": statistics.median(latencies) if latencies else 0.0,
+        "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+        "max_lag": max(lags, default=0.0),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--channel-id", type=int, required=True)
+    parser.add_argument("--company-id", type=int, required=True)
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma separated concurrency levels")
+    parser.add_argument("--runs", type=int, help="generations per level, 2 x the level by default")
+    parser.add_argument("--topic", default="Latest news", help="topic of the similarity search")
+    parser.add_argument("--random", action="store_true", help="random documents instead of the similarity search")
+    parser.add_argument("--batch", action="store_true", help="run each level through generate_posts")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    graph = PostGraph().get_compiled_graph()
+
+    async def run():
+        try:
+            results = {level: await run_level(graph, level, args.runs or 2 * level, args) for level in levels}
+            return results, await response_cache.stats()
+        finally:
+            await close_es()
+            await close_redis()
+
+    results, cache_stats = asyncio.run(run())
+    print(
+        f"{'concurrency':>11} {'gen/s':>8} {'p50 s':>8} {'p95 s':>8} "
+        f"{'embed ms':>9} {'search ms':>10} {'max lag s':>10} {'errors':>7}"
+    )
+    for level, r in results.items():
+        print(
+            f"{level:>11} {r['throughput']:>8.2f} {r['p50']:>8.2f} {r['p95']:>8.2f} "
+            f"{r['embed'] * 1000:>9.0f} {r['search'] * 1000:>10.0f} {r['max_lag']:>10.3f} {r['errors']:>7}"
+        )
+    # counters are global, they include every process using the cache
+    print(f"LLM response cache: {cache_stats}")
+
+
+if __name__ == "__main__":
+    main()
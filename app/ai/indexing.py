@@ -0,0 +1,84 @@
+import time
+from typing import AsyncIterable, Iterable, List, Tuple, Union
+
+from celery.utils.log import get_task_logger
+from elasticsearch.helpers import async_streaming_bulk
+
+from app import config
+from app.elastic import get_es
+
+logger = get_task_logger(__name__)
+
+INDEX_NAME = "documents"
+
+
+async def bulk_index(actions: Union[AsyncIterable[dict], Iterable[dict]]) -> Tuple[int, List[dict]]:
+    """
+    Stream `actions` to Elasticsearch in bulk requests bounded by ES_BULK_CHUNK_SIZE
+    documents and ES_BULK_MAX_BYTES bytes. Items rejected with 429 are retried with backoff.
+
+    The index keeps its refresh interval, concurrent ingests share it, and is
+    refreshed once at the end so the documents are searchable when this returns.
+
+    Returns the number of indexed documents and the per-item errors.
+    """
+    indexed = 0
+    errors = []
+    start = time.time()
+    async for ok, item in async_streaming_bulk(
+        get_es(),
+        actions,
+        chunk_size=config.ES_BULK_CHUNK_SIZE,
+        max_chunk_bytes=config.ES_BULK_MAX_BYTES,
+        max_retries=config.ES_BULK_MAX_RETRIES,
+        initial_backoff=1,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        if ok:
+            indexed += 1
+            continue
+        error = item.get("index", item)
+        errors.append(error)
+        logger.warning(f"Failed to index document {error.get('_id')}: {error.get('error')}")
+    if indexed:
+        await get_es().indices.refresh(index=INDEX_NAME)
+
+    elapsed = time.time() - start
+    logger.info(
+        f"Indexed {indexed} documents ({len(errors)} failed) in {elapsed:.2f}s, "
+        f"{indexed / elapsed if elapsed else 0:.1f} chunks/s"
+    )
+    return indexed, errors
+
+
+async def copy_document(document_id: str, from_channel_id: int, to_channel_id: int, company_id: int) -> int:
+    """
+    Copy the indexed chunks of a document to another channel of the same company,
+    embeddings included, without going through extraction and embedding again.
+
+    Returns the number of copied chunks.
+    """
+    result = await get_es().reindex(
+        source={
+            "index": INDEX_NAME,
+            "query": {
+                "bool": {
+                    "must": [
+                        {"match": {"document_id": document_id}},
+                        {"match": {"channel_id": str(from_channel_id)}},
+                        {"match": {"company_id": str(company_id)}},
+                    ]
+                }
+            },
+        },
+        dest={"index": INDEX_NAME},
+        script={
+            "lang": "painless",
+            "source": "ctx._id = ctx._id + '_' + params.channel_id; ctx._source.id = ctx._id; ctx._source.channel_id = params.channel_id",
+            "params": {"channel_id": to_channel_id},
+        },
+        refresh=True,
+        wait_for_completion=True,
+    )
+    return result["created"] + result["updated"]
@@ -0,0 +1,157 @@
+"""
+Chunks per second of bulk_index against the old one request per chunk loop.
+
+    python -m app.ai.indexing_benchmark [--chunks N] [--dims N] [--latency MS] [--url URL]
+
+Both modes index the same `chunks` documents shaped like the ingested ones, with
+`dims` dimension embeddings. "per chunk" is the loop proceed_upload_file_task used
+to run, one synchronous index request per chunk; "bulk" is bulk_index. Without
+--url a local server answering like Elasticsearch is started, every request costing
+`latency` ms, so the benchmark runs without Elasticsearch and measures round trips
+and serialisation, not indexing. With --url the documents go to a throwaway
+`documents_benchmark` index there, deleted at the end.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator
+from uuid import uuid4
+
+from elasticsearch import Elasticsearch
+
+from app import config
+from app.ai import indexing
+from app.elastic import close_es
+
+BENCHMARK_INDEX = "documents_benchmark"
+
+
+class FakeElasticsearchHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def respond(self, body: dict):
+        time.sleep(self.latency)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        # the client refuses servers that don't identify as Elasticsearch
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        self.respond({"version": {"number": "8.14.0"}, "tagline": "You Know, for Search"})
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split("?", 1)[0]
+        if path.endswith("/_bulk"):
+            items = [
+                {"index": {"_id": json.loads(line)["index"]["_id"], "status": 201, "result": "created"}}
+                for line in body.splitlines()[::2]
+            ]
+            self.respond({"took": 1, "errors": False, "items": items})
+        elif "/_doc/" in path:
+            self.respond({"_id": path.rsplit("/", 1)[-1], "result": "created", "_version": 1})
+        else:
+            self.respond({"_shards": {"total": 1, "successful": 1, "failed": 0}})
+
+    # the client sends bulk and index requests with PUT
+    do_PUT = do_POST
+
+    def do_DELETE(self):
+        self.respond({"acknowledged": True})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_local_server(latency: float) -> str:
+    handler = type("Handler", (FakeElasticsearchHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def documents(count: int, dims: int) -> Iterator[Dict]:
+    for page in range(count):
+        _id = uuid4().hex
+        yield {
+            "id": _id,
+            "document_id": "benchmark",
+            "title": "benchmark.txt",
+            "text": "lorem ipsum dolor sit amet " * 18,  # about a 512 character chunk
+            "timestamp": "2025-01-01",
+            "channel_id": 0,
+            "company_id": 0,
+            "embedding": [random.random() for _ in range(dims)],
+            "metadata": {"source": "document"},
+            "page": page,
+        }
+
+
+def per_chunk(url: str, args) -> float:
+    es = Elasticsearch(url)
+    start = time.perf_counter()
+    for document in documents(args.chunks, args.dims):
+        es.index(index=BENCHMARK_INDEX, id=document["id"], document=document)
+    es.indices.refresh(index=BENCHMARK_INDEX)
+    elapsed = time.perf_counter() - start
+    es.close()
+    return elapsed
+
+
+def bulk(url: str, args) -> float:
+    config.ELASTICSEARCH_HOST = url
+    indexing.INDEX_NAME = BENCHMARK_INDEX
+
+    async def run() -> float:
+        actions = (
+            {"_index": BENCHMARK_INDEX, "_id": document["id"], "_source": document}
+            for document in documents(args.chunks, args.dims)
+        )
+        start = time.perf_counter()
+        try:
+            indexed, errors = await indexing.bulk_index(actions)
+        finally:
+            await close_es()
+        if errors:
+            print(f"bulk: {len(errors)} of {args.chunks} chunks failed")
+        return time.perf_counter() - start
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dims", type=int, default=768, help="embedding dimensions")
+    parser.add_argument("--latency", type=float, default=2, help="ms per request of the local server")
+    parser.add_argument("--url", help="Elasticsearch to index into, a local stand-in by default")
+    args = parser.parse_args()
+    url = args.url or start_local_server(args.latency / 1000)
+
+    results = {"per chunk": per_chunk(url, args), "bulk": bulk(url, args)}
+    if args.url:
+        Elasticsearch(url).indices.delete(index=BENCHMARK_INDEX, ignore_unavailable=True)
+
+    print(f"{'mode':<10} {'seconds':>8} {'chunks/s':>10}")
+    for mode, elapsed in results.items():
+        print(f"{mode:<10} {elapsed:>8.2f} {args.chunks / elapsed:>10.1f}")
+    print(f"bulk is {results['per chunk'] / results['bulk']:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
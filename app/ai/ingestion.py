@@ -0,0 +1,133 @@
+import asyncio
+from typing import Iterable, Iterator, List, Tuple
+from uuid import uuid4
+
+import arrow
+import fitz
+from celery.utils.log import get_task_logger
+from langchain_text_splitters import CharacterTextSplitter
+
+from app import config
+from app.ai import schemas as ai_schemas
+from app.ai.embeddings import AsyncEmbedder
+from app.ai.indexing import INDEX_NAME, bulk_index
+
+logger = get_task_logger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".txt", ".md")
+TEXT_BLOCK_SIZE = 64 * 1024  # characters read at once from text files
+CHUNK_SIZE = 512
+CHUNK_OVERLAP = 64
+
+
+def iter_pages(file_path: str) -> Iterator[str]:
+    """
+    Yield the text of a file piece by piece: one page for PDFs, one block for text files.
+    """
+    if file_path.endswith(".pdf"):
+        doc = fitz.open(file_path, filetype="pdf")
+        try:
+            for page in doc:
+                yield page.get_text() + "\n\n"
+        finally:
+            doc.close()
+    else:
+        with open(file_path, "r", encoding="utf-8") as file:
+            while block := file.read(TEXT_BLOCK_SIZE):
+                yield block
+
+
+def cut_text(text: str, size: int) -> Iterator[str]:
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+def iter_chunks(pages: Iterable[str], splitter: CharacterTextSplitter, chunk_size: int) -> Iterator[str]:
+    """
+    Split text incrementally. Only a few chunks worth of text is buffered; the last,
+    possibly incomplete, chunk is carried over and split again with the next page.
+    Text the splitter finds no separator in is cut every `chunk_size` characters, so
+    neither the chunks nor the carried over text grow with the input.
+    """
+    buffer = ""
+    buffer_limit = chunk_size * 8
+    for page in pages:
+        buffer += page
+        if len(buffer) < buffer_limit:
+            continue
+        chunks = splitter.split_text(buffer)
+        buffer = chunks.pop() if chunks else ""
+        for chunk in chunks:
+            yield from cut_text(chunk, chunk_size)
+        if len(buffer) >= buffer_limit:
+            # a run without separators: cut at the limit, carry the rest forward
+            cut = len(buffer) - len(buffer) % chunk_size
+            yield from cut_text(buffer[:cut], chunk_size)
+            buffer = buffer[cut:]
+    if buffer.strip():
+        for chunk in splitter.split_text(buffer):
+            yield from cut_text(chunk, chunk_size)
+
+
+class IngestionPipeline:
+    """
+    page extractor -> incremental splitter -> embedding batcher -> bulk indexer
+
+    Stages are connected with bounded queues, so at most INGEST_QUEUE_SIZE batches
+    wait between two stages and memory stays flat whatever the document size.
+    The embedding stage keeps up to EMBEDDING_MAX_IN_FLIGHT requests running.
+    """
+
+    def __init__(self, embedder: AsyncEmbedder, document_id: str, credentials: dict):
+        self.embedder = embedder
+        self.document_id = document_id
+        self.credentials = credentials
+        self.splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        self.chunks = 0
+
+    async def extract(self, file_path: str, out: asyncio.Queue):
+        # fitz and the splitter are blocking, pull one batch at a time in a thread
+        chunks = enumerate(iter_chunks(iter_pages(file_path), self.splitter, chunk_size=CHUNK_SIZE))
+        batches = self.embedder.iter_batches(chunks, key=lambda chunk: chunk[1])
+        while batch := await asyncio.to_thread(next, batches, None):
+            self.chunks += len(batch)
+            await out.put(batch)
+        await out.put(None)
+
+    async def actions(self, source: asyncio.Queue):
+        while (item := await source.get()) is not None:
+            batch, embeddings = item
+            for (position, text), embedding in zip(batch, embeddings):
+                _id = uuid4().hex
+                es_document = ai_schemas.ES_Document(
+                    id=_id,
+                    document_id=self.document_id,
+                    title=self.credentials["source_metadata"]["file_name"],
+                    text=text,
+                    timestamp=arrow.now().format("YYYY-MM-DD"),
+                    channel_id=self.credentials["channel_id"],
+                    company_id=self.credentials["company_id"],
+                    embedding=embedding,
+                    metadata={"source": "document"},
+                    page=position,
+                )
+                yield {"_index": INDEX_NAME, "_id": _id, "_source": es_document.model_dump()}
+
+    async def run(self, file_path: str) -> Tuple[int, List[dict]]:
+        """
+        Ingest a file. Returns the number of indexed chunks and the per-chunk errors.
+        """
+        chunk_queue = asyncio.Queue(maxsize=config.INGEST_QUEUE_SIZE)
+        document_queue = asyncio.Queue(maxsize=config.INGEST_QUEUE_SIZE)
+        tasks = [
+            asyncio.ensure_future(self.extract(file_path, chunk_queue)),
+            asyncio.ensure_future(self.embedder.embed_stream(chunk_queue, document_queue, key=lambda chunk: chunk[1])),
+            asyncio.ensure_future(bulk_index(self.actions(document_queue))),
+        ]
+        try:
+            results = await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+        return results[-1]
@@ -1,5 +1,8 @@
-from datetime import datetime
-from sqlalchemy import ForeignKey, DateTime, JSON, ARRAY, Integer, String
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+import pytz
+from sqlalchemy import ForeignKey, DateTime, JSON, ARRAY, Integer, String, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -8,18 +11,22 @@ from app.database import Base
 
 class Source(Base):
     __tablename__ = "sources"
+    __table_args__ = (
+        Index("ix_sources_channel_id_created_at_id", "channel_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     channel_id: Mapped[int] = mapped_column(ForeignKey("channels.id", ondelete="CASCADE"))
-    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"))
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     source_type: Mapped[str] = mapped_column(nullable=False, server_default="file") # file, document
     source_metadata: Mapped[dict] = mapped_column(JSON, nullable=False)
     document_id: Mapped[str] = mapped_column(nullable=False)
+    content_hash: Mapped[str] = mapped_column(nullable=True, index=True)  # sha256 of the uploaded content
 
-    channel: Mapped["Channel"] = relationship(back_populates="sources")
-    company: Mapped["Company"] = relationship(back_populates="sources")
+    channel: Mapped["Channel"] = relationship(back_populates="sources", lazy="raise")
+    company: Mapped["Company"] = relationship(back_populates="sources", lazy="raise")
 
 
 class AIConfig(Base):
@@ -38,14 +45,17 @@ class AIConfig(Base):
     emojis: Mapped[bool] = mapped_column(nullable=False, server_default="false")  # true, false
     custom_instructions: Mapped[str] = mapped_column(nullable=False, server_default="")  # custom instructions for the AI
 
-    channel: Mapped["Channel"] = relationship(back_populates="ai_config")
+    channel: Mapped["Channel"] = relationship(back_populates="ai_config", lazy="raise")
 
 
 class ScheduledAIPost(Base):
     __tablename__ = "scheduled_ai_posts"
+    __table_args__ = (
+        Index("ix_scheduled_ai_posts_due", "next_run_at", postgresql_where=text("is_active")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    channel_id: Mapped[int] = mapped_column(ForeignKey("channels.id", ondelete="CASCADE"))
+    channel_id: Mapped[int] = mapped_column(ForeignKey("channels.id", ondelete="CASCADE"), index=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     weekdays: Mapped[str] = mapped_column(ARRAY(Integer), nullable=False) # [0, 1, 2, 3, 4, 5, 6] for all days
@@ -53,6 +63,26 @@ class ScheduledAIPost(Base):
     is_active: Mapped[bool] = mapped_column(nullable=False, server_default="true") # true, false
     timezone: Mapped[str] = mapped_column(nullable=True, server_default="UTC")  # Timezone of the scheduled time
     last_run_at: Mapped[datetime] = mapped_column(server_default=func.now(), nullable=False)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=True)  # UTC, null when inactive
+
+    channel: Mapped["Channel"] = relationship(back_populates="scheduled_ai_posts", lazy="raise")
 
-    channel: Mapped["Channel"] = relationship(back_populates="scheduled_ai_posts")
+    def get_next_run_at(self, after: datetime) -> Optional[datetime]:
+        """
+        First slot of the schedule strictly after `after` (aware), in UTC.
+        """
+        if not self.is_active or not self.weekdays or not self.times:
+            return None
+        tz_info = pytz.timezone(self.timezone or "UTC")
+        after_local = after.astimezone(tz_info)
+        times = sorted(time.fromisoformat(value) for value in self.times)
+        for days in range(8):
+            day = after_local.date() + timedelta(days=days)
+            if day.weekday() not in self.weekdays:
+                continue
+            for slot in times:
+                run_at = tz_info.localize(datetime.combine(day, slot))
+                if run_at > after_local:
+                    return run_at.astimezone(pytz.utc)
+        return None
 
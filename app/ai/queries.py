@@ -1,9 +1,10 @@
 from app.ai.models import Source, AIConfig, ScheduledAIPost
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Optional
 
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlalchemy import select, insert, delete, update, func
+from sqlalchemy import select, insert, delete, update, func, tuple_
+from app.pagination import Cursor, capped_count, page_items, paginate
 import traceback
 
 
@@ -48,31 +49,52 @@ async def get_source_query(source_id: int, company_id: int, session: AsyncSessio
         return None
 
 
-async def get_sources_query(company_id: int, channel_id: int, page: int, limit: int, session: AsyncSession) -> tuple[List[Source], int]:
+async def get_sources_by_content_hash_query(company_id: int, content_hash: str, session: AsyncSession) -> List[Source]:
     try:
-        page = max(page, 1)
-        stmt = (
+        result = await session.execute(
             select(Source)
             .where(Source.company_id == company_id)
-            .where(Source.channel_id == channel_id)
-            .offset((page - 1) * limit)
-            .limit(limit).order_by(Source.created_at.desc())
+            .where(Source.content_hash == content_hash)
+            .order_by(Source.created_at)
         )
-        result = await session.execute(stmt)
-        sources = result.scalars().all()
+        return result.scalars().all()
+    except Exception as e:
+        traceback.print_exc()
+        return []
+
 
-        count_stmt = (
-            select(func.count(Source.id))
+async def get_sources_query(
+    company_id: int,
+    channel_id: int,
+    page: int,
+    limit: int,
+    session: AsyncSession,
+    after: Optional[Cursor] = None,
+    with_total: bool = True,
+) -> tuple[List[Source], Optional[int], Optional[str]]:
+    try:
+        stmt = paginate(
+            select(Source)
             .where(Source.company_id == company_id)
-            .where(Source.channel_id == channel_id)
+            .where(Source.channel_id == channel_id),
+            Source, page, limit, after,
         )
-        count_result = await session.execute(count_stmt)
-        total_count = count_result.scalar_one()
+        result = await session.execute(stmt)
+        sources, next_cursor = page_items(result.scalars().all(), limit)
+
+        total_count = None
+        if with_total:
+            count_stmt = (
+                select(Source.id)
+                .where(Source.company_id == company_id)
+                .where(Source.channel_id == channel_id)
+            )
+            total_count = await capped_count(count_stmt, session)
 
-        return sources, total_count
+        return sources, total_count, next_cursor
     except Exception as e:
         traceback.print_exc()
-        return [], 0
+        return [], 0, None
 
 
 async def get_or_create_ai_config_query(
@@ -105,6 +127,37 @@ async def get_or_create_ai_config_query(
         traceback.print_exc()
 
 
+async def get_or_create_ai_configs_query(
+    channels: List[tuple],
+    session: AsyncSession,
+) -> Dict[int, AIConfig]:
+    """
+    AI configs of many (company_id, channel_id) pairs by channel id, the missing
+    ones are created with the defaults, one select and at most one insert.
+    """
+    try:
+        if not channels:
+            return {}
+        stmt = select(AIConfig).where(tuple_(AIConfig.company_id, AIConfig.channel_id).in_(channels))
+        result = await session.execute(stmt)
+        ai_configs = {ai_config.channel_id: ai_config for ai_config in result.scalars().all()}
+
+        missing = [
+            {"company_id": company_id, "channel_id": channel_id}
+            for company_id, channel_id in dict.fromkeys(channels)
+            if channel_id not in ai_configs
+        ]
+        if missing:
+            result = await session.execute(insert(AIConfig).returning(AIConfig), missing)
+            await session.commit()
+            ai_configs.update({ai_config.channel_id: ai_config for ai_config in result.scalars().all()})
+        return ai_configs
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return {}
+
+
 async def update_ai_config_query(
     company_id: int,
     channel_id: int,
@@ -206,6 +259,16 @@ async def get_scheduled_ai_post_by_id_query(scheduled_ai_post_id: int, company_i
         return None
 
 
+async def get_scheduled_ai_posts_by_ids_query(ids: List[int], session: AsyncSession) -> List[ScheduledAIPost]:
+    try:
+        stmt = select(ScheduledAIPost).where(ScheduledAIPost.id.in_(ids))
+        result = await session.execute(stmt)
+        return result.scalars().all()
+    except Exception as e:
+        traceback.print_exc()
+        return []
+
+
 async def get_all_scheduled_ai_posts_query(session: AsyncSession) -> List[ScheduledAIPost]:
     try:
         stmt = select(ScheduledAIPost).where(ScheduledAIPost.is_active == True)
@@ -216,6 +279,32 @@ async def get_all_scheduled_ai_posts_query(session: AsyncSession) -> List[Schedu
         return []
 
 
+async def claim_due_scheduled_ai_posts_query(now: datetime, limit: int, session: AsyncSession) -> List[ScheduledAIPost]:
+    """
+    Lock up to `limit` active schedulers whose next_run_at has passed, move their
+    next_run_at to the following slot and return them. Missed slots are run once.
+    """
+    try:
+        stmt = (
+            select(ScheduledAIPost)
+            .where(ScheduledAIPost.is_active == True)
+            .where(ScheduledAIPost.next_run_at <= now)
+            .order_by(ScheduledAIPost.next_run_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await session.execute(stmt)
+        schedulers = result.scalars().all()
+        for scheduler in schedulers:
+            scheduler.next_run_at = scheduler.get_next_run_at(now)
+        await session.commit()
+        return schedulers
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return []
+
+
 async def update_scheduled_ai_post_query(
     scheduled_ai_post_id: int,
     company_id: int,
@@ -235,4 +324,16 @@ async def update_scheduled_ai_post_query(
         return result.scalars().first()
     except Exception as e:
         await session.rollback()
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+
+
+async def update_scheduled_ai_posts_query(ids: List[int], data: dict, session: AsyncSession) -> int:
+    try:
+        stmt = update(ScheduledAIPost).where(ScheduledAIPost.id.in_(ids)).values(**data)
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.rowcount
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return 0
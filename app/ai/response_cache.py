@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
+from typing import List, Optional
+
+from app import config
+from app.ai.embeddings import pack_vector, unpack_vector
+from app.cache import RedisLRUCache, close_redis, get_redis
+
+response_cache = RedisLRUCache(
+    namespace="llm",
+    max_entries=config.LLM_CACHE_MAX_ENTRIES,
+    ttl=config.LLM_CACHE_TTL,
+)
+
+
+def _hash(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+
+def model_params(model) -> dict:
+    return {"model": model.model_name, "temperature": model.temperature, "max_tokens": model.max_tokens}
+
+
+def response_cache_key(state, model) -> str:
+    """
+    Hash of the final prompt, the ids of the retrieved documents, the model and its
+    generation parameters. The prompt holds the channel's AI config and the topic.
+    """
+    kwargs = state["additional_kwargs"]
+    return _hash(model_params(model), kwargs["prompt"], sorted(kwargs.get("document_ids") or []))
+
+
+def _topic_keys(state, model) -> tuple:
+    # topics are only compared within the same channel, prompt and model
+    kwargs = state["additional_kwargs"]
+    scope = _hash(model_params(model), kwargs["channel_id"], kwargs["company_id"], kwargs.get("base_prompt"))
+    return f"llm:topics:{scope}", f"llm:topic_vectors:{scope}"
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+async def find_similar_topic(state, model) -> Optional[str]:
+    """
+    Cache key of the most similar cached topic of the same scope, if its cosine
+    similarity reaches LLM_SEMANTIC_CACHE_THRESHOLD.
+    """
+    vector = state["additional_kwargs"].get("topic_embedding")
+    if not vector:
+        return None
+    _, vectors_key = _topic_keys(state, model)
+    vectors = await get_redis().hgetall(vectors_key)
+    query = _normalize(vector)
+    best_key, best = None, config.LLM_SEMANTIC_CACHE_THRESHOLD
+    for key, data in vectors.items():
+        similarity = sum(a * b for a, b in zip(query, unpack_vector(data)))
+        if similarity >= best:
+            best_key, best = key.decode(), similarity
+    return best_key
+
+
+async def remember_topic(state, model, key: str):
+    """
+    Keep the topic embedding of a cached response, at most LLM_SEMANTIC_CACHE_MAX_TOPICS
+    per scope, the oldest are dropped first.
+    """
+    topics_key, vectors_key = _topic_keys(state, model)
+    redis = get_redis()
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(vectors_key, key, pack_vector(_normalize(state["additional_kwargs"]["topic_embedding"])))
+        pipe.zadd(topics_key, {key: time.time()})
+        pipe.expire(vectors_key, config.LLM_CACHE_TTL)
+        pipe.expire(topics_key, config.LLM_CACHE_TTL)
+        pipe.zcard(topics_key)
+        size = (await pipe.execute())[-1]
+    if size > config.LLM_SEMANTIC_CACHE_MAX_TOPICS:
+        evicted = await redis.zpopmin(topics_key, size - config.LLM_SEMANTIC_CACHE_MAX_TOPICS)
+        if evicted:
+            await redis.hdel(vectors_key, *(key for key, _ in evicted))
+
+
+async def get_cached_response(state, model) -> Optional[str]:
+    """
+    Cached response for the final prompt and documents of `state`, or, with
+    LLM_SEMANTIC_CACHE, the one of a close enough topic. Counts hits, misses and
+    the tokens the hit saved.
+    """
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    try:
+        data = await response_cache.get(response_cache_key(state, model), count=False)
+        semantic = False
+        if data is None and config.LLM_SEMANTIC_CACHE:
+            similar = await find_similar_topic(state, model)
+            if similar:
+                data = await response_cache.get(similar, count=False)
+                semantic = data is not None
+        if data is None:
+            await response_cache.incr_stats(misses=1)
+            return None
+        entry = json.loads(data)
+        await response_cache.incr_stats(hits=1, semantic_hits=int(semantic), saved_tokens=entry["tokens"])
+        return entry["response"]
+    except Exception as e:
+        print(f"LLM response cache unavailable: {e}")
+        return None
+
+
+async def cache_response(state, model, response: str, tokens: int = 0):
+    """
+    Store the model's response for `state`, `tokens` being what the call used.
+    """
+    if not config.LLM_CACHE_ENABLED or not response:
+        return
+    try:
+        key = response_cache_key(state, model)
+        await response_cache.set(key, json.dumps({"response": response, "tokens": tokens}).encode("utf-8"))
+        if config.LLM_SEMANTIC_CACHE and state["additional_kwargs"].get("topic_embedding"):
+            await remember_topic(state, model, key)
+    except Exception as e:
+        print(f"LLM response cache unavailable: {e}")
+
+
+def total_tokens(message) -> int:
+    usage = getattr(message, "usage_metadata", None) or {}
+    return usage.get("total_tokens", 0)
+
+
+if __name__ == "__main__":
+    async def print_stats():
+        try:
+            # hits, misses, semantic_hits and saved_tokens since the counters were created
+            print(await response_cache.stats())
+        finally:
+            await close_redis()
+
+    asyncio.run(print_stats())
@@ -1,22 +1,29 @@
+import hashlib
+import os
+from datetime import datetime, timezone
 from typing import Optional, List
 
 from app.ai import prompts
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from langchain_elasticsearch import ElasticsearchStore
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.ai import queries as ai_queries
+from app.ai.models import ScheduledAIPost
 from uuid import uuid4
 from app import config
-from app.ai.utils import add_ai_config_prompt
+from app.ai.streaming import stream_generated_post
+from app.ai.utils import add_ai_config_prompt, find_duplicate_source
 from app.auth import auth as auth_tools
-from app.billing.services.rate_limit import check_rate_limit, check_source_rate_limit
+from app.auth.cache import UserSnapshot
+from app.billing.services.rate_limit import check_rate_limit, check_source_rate_limit, release_rate_limit
 from app.billing.services.usage import check_and_consume_usage
-from app.celery_tasks import ai_generate_post_task, proceed_upload_file_task
+from app.celery_tasks import ai_generate_post_task, proceed_upload_file_task, copy_source_task
 from app.channels import queries as channel_queries
 from app.schemas import SuccessResponseSchema
 from app.ai import schemas as ai_schemas
-from app.users import models as user_models
 from app.database import get_session
+from app.pagination import decode_cursor
 
 
 router = APIRouter()
@@ -26,7 +33,7 @@ router = APIRouter()
 async def upload_file(
     channel_id: int,
     file: Optional[UploadFile] = File(...),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Uploading file...")
@@ -50,9 +57,11 @@ async def upload_file(
     filename = f"{file.filename.split('.')[0]}_{uuid4().hex[:5]}.{file.filename.split('.')[-1]}"
     file_path = f"{config.UPLOAD_FOLDER}/{filename}"
 
+    content_hash = hashlib.sha256()
     with open(file_path, "wb") as f:
         while content := await file.read(1024 * 1024): # 1MB chunks
             f.write(content)
+            content_hash.update(content)
     credentials = {
         "channel_id": channel_id,
         "company_id": user.company_id,
@@ -61,7 +70,24 @@ async def upload_file(
             "file_name": file.filename,
             "file_type": file.content_type
         },
+        "content_hash": content_hash.hexdigest(),
     }
+
+    try:
+        duplicate = await find_duplicate_source(
+            channel_id=channel_id,
+            company_id=user.company_id,
+            content_hash=credentials["content_hash"],
+            session=session,
+        )
+    except HTTPException:
+        os.remove(file_path)
+        raise
+    if duplicate:
+        os.remove(file_path)
+        copy_source_task.delay(duplicate.id, credentials)
+        return {"message": f"File is already processed for another channel, it will be added to this channel soon."}
+
     proceed_upload_file_task.delay(file_path, credentials)
     return {"message": f"File will be processed in background and you will see the result in the channel soon."}
 
@@ -70,7 +96,7 @@ async def upload_file(
 async def upload_document(
     channel_id: int,
     data: ai_schemas.DocumentInSchema,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Uploading document...")
@@ -92,8 +118,6 @@ async def upload_document(
 
     filename = f"{data.title.replace(' ', '_')}_{uuid4().hex[:5]}.txt"
     file_path = f"{config.UPLOAD_FOLDER}/{filename}"
-    with open(file_path, "w") as f:
-        f.write(data.text)
     credentials = {
         "channel_id": channel_id,
         "company_id": user.company_id,
@@ -102,7 +126,21 @@ async def upload_document(
             "file_name": filename,
             "file_type": "text/plain",
         },
+        "content_hash": hashlib.sha256(data.text.encode("utf-8")).hexdigest(),
     }
+
+    duplicate = await find_duplicate_source(
+        channel_id=channel_id,
+        company_id=user.company_id,
+        content_hash=credentials["content_hash"],
+        session=session,
+    )
+    if duplicate:
+        copy_source_task.delay(duplicate.id, credentials)
+        return {"message": f"Document is already processed for another channel, it will be added to this channel soon."}
+
+    with open(file_path, "w") as f:
+        f.write(data.text)
     proceed_upload_file_task.delay(file_path, credentials)
     return {"message": f"Document is being processed in background."}
 
@@ -112,7 +150,9 @@ async def get_sources(
     channel_id: int,
     page: int = 1,
     limit: int = 10,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    cursor: Optional[str] = None,
+    with_total: bool = True,
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Getting sources...")
@@ -126,23 +166,26 @@ async def get_sources(
     if not channel:
         raise HTTPException(status_code=404, detail="Channel not found.")
 
-    sources, total_count = await ai_queries.get_sources_query(
+    sources, total_count, next_cursor = await ai_queries.get_sources_query(
         session=session,
         company_id=user.company_id,
         channel_id=channel_id,
         page=page,
         limit=limit,
+        after=decode_cursor(cursor),
+        with_total=with_total,
     )
 
     return {
         "sources": sources,
-        "total": total_count
+        "total": total_count,
+        "next_cursor": next_cursor,
     }
 
 @router.delete("/sources", response_model=SuccessResponseSchema)
 async def delete_source(
     source_id: int,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Deleting source...")
@@ -184,15 +227,15 @@ async def delete_source(
     return {"message": "Source deleted successfully."}
 
 
-@router.post("/generate/posts", response_model=SuccessResponseSchema)
-async def generate_posts(
+async def get_generation_input(
     channel_id: int,
     data: ai_schemas.GeneratePostsInSchema,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
-    session: AsyncSession = Depends(get_session),
-):
-    print("Generating posts...")
-
+    user: UserSnapshot,
+    session: AsyncSession,
+) -> dict:
+    """
+    Check the channel, rate limit and usage of a generation and build the graph input.
+    """
     # get channel
     channel = await channel_queries.get_channel_query(
         session=session,
@@ -203,8 +246,7 @@ async def generate_posts(
         raise HTTPException(status_code=404, detail="Channel not found.")
 
     # check rate limit
-    await check_rate_limit(
-        db=session,
+    rate_limit = await check_rate_limit(
         channel=channel,
         action="ai_generate"
     )
@@ -224,15 +266,20 @@ async def generate_posts(
     if not ai_config:
         raise HTTPException(status_code=404, detail="AI config not found.")
 
-    await check_and_consume_usage(
-        db=session,
-        company=user.company,
-        action="ai"
-    )
+    try:
+        await check_and_consume_usage(
+            db=session,
+            company=user.company,
+            action="ai"
+        )
+    except HTTPException:
+        # a generation refused for usage doesn't count against the rate limit
+        await release_rate_limit(rate_limit)
+        raise
 
     prompt = await add_ai_config_prompt(prompt, ai_config)
 
-    input_values = {
+    return {
         "additional_kwargs": {
             "prompt": prompt,
             "channel_id": channel_id,
@@ -241,15 +288,46 @@ async def generate_posts(
             "timezone": user.settings.timezone
         }
     }
+
+
+@router.post("/generate/posts", response_model=SuccessResponseSchema)
+async def generate_posts(
+    channel_id: int,
+    data: ai_schemas.GeneratePostsInSchema,
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
+    session: AsyncSession = Depends(get_session),
+):
+    print("Generating posts...")
+    input_values = await get_generation_input(channel_id, data, user, session)
     ai_generate_post_task.delay(input_values)
 
     return {"message": "Added to queue. You will see the post in the channel soon."}
 
 
+@router.post("/generate/posts/stream")
+async def generate_posts_stream(
+    channel_id: int,
+    data: ai_schemas.GeneratePostsInSchema,
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Generate a post in the request, without the Celery queue, and stream it as
+    Server-Sent Events: `token` events with the text, then `done` with the post id
+    or `error`. Usage and rate limits are checked as for /generate/posts.
+    """
+    input_values = await get_generation_input(channel_id, data, user, session)
+    return StreamingResponse(
+        stream_generated_post(input_values),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/ai/config", response_model=ai_schemas.AIConfigOutSchema)
 async def get_ai_config(
     channel_id: int,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Getting AI config...")
@@ -279,7 +357,7 @@ async def get_ai_config(
 async def update_ai_config(
     channel_id: int,
     data: ai_schemas.AIConfigUpdateSchema,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Updating AI config...")
@@ -316,7 +394,7 @@ async def update_ai_config(
 @router.get("/scheduled-posts", response_model=List[ai_schemas.ScheduledAIPostOutSchema])
 async def get_scheduled_posts(
     channel_id: int,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Getting scheduled posts...")
@@ -344,7 +422,7 @@ async def get_scheduled_posts(
 async def delete_scheduled_post(
     scheduled_post_id: int,
     channel_id: int,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Deleting scheduled post...")
@@ -372,7 +450,7 @@ async def delete_scheduled_post(
 async def create_scheduled_post(
     channel_id: int,
     data: ai_schemas.ScheduledAIPostInSchema,
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Creating scheduled post...")
@@ -390,6 +468,7 @@ async def create_scheduled_post(
     data_dict["channel_id"] = channel_id
     data_dict["company_id"] = user.company_id
     data_dict["timezone"] = data.timezone or user.settings.timezone
+    data_dict["next_run_at"] = ScheduledAIPost(**data_dict).get_next_run_at(datetime.now(tz=timezone.utc))
 
     # create scheduled post
     scheduled_post = await ai_queries.create_scheduled_ai_post_query(
@@ -406,7 +485,7 @@ async def activate_scheduled_post(
     scheduled_post_id: int,
     channel_id: int,
     action: str = "activate",
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
     session: AsyncSession = Depends(get_session),
 ):
     print("Activating scheduled post...")
@@ -421,11 +500,23 @@ async def activate_scheduled_post(
         raise HTTPException(status_code=404, detail="Channel not found.")
 
     # get scheduled post
+    scheduled_post = await ai_queries.get_scheduled_ai_post_by_id_query(
+        session=session,
+        scheduled_ai_post_id=scheduled_post_id,
+        company_id=user.company_id,
+    )
+    if not scheduled_post:
+        raise HTTPException(status_code=404, detail="Scheduled post not found.")
+
+    scheduled_post.is_active = action == "activate"
     scheduled_post = await ai_queries.update_scheduled_ai_post_query(
         session=session,
         scheduled_ai_post_id=scheduled_post_id,
         company_id=user.company_id,
-        data={"is_active": action == "activate"}
+        data={
+            "is_active": scheduled_post.is_active,
+            "next_run_at": scheduled_post.get_next_run_at(datetime.now(tz=timezone.utc)),
+        }
     )
     if not scheduled_post:
         raise HTTPException(status_code=404, detail="Scheduled post not found.")
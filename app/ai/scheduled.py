@@ -0,0 +1,150 @@
+from datetime import datetime
+from typing import List
+
+from celery.utils.log import get_task_logger
+
+from app.ai import prompts
+from app.ai import queries as ai_queries
+from app.ai.graph import generate_posts
+from app.ai.utils import add_ai_config_prompt
+from app.billing.services.rate_limit import check_rate_limit, release_rate_limit
+from app.billing.services.usage import check_and_consume_usage
+from app.channels import queries as channel_queries
+from app.channels.models import Channel
+from app.database import async_session_maker
+from app.posts import queries as post_queries
+
+logger = get_task_logger(__name__)
+
+
+def get_channel_prompt(channel: Channel) -> str:
+    if channel.channel_type == "telegram":
+        return prompts.TELEGRAM
+    if channel.channel_type == "api":
+        return prompts.API
+    return prompts.GENERAL
+
+
+async def generate_scheduled_posts(items: List[dict], draft: bool = False) -> int:
+    """
+    Generate the posts of a batch of due schedulers, items as
+    {"scheduler_id", "channel_id", "company_id"}.
+
+    Channels, schedulers and AI configs are loaded for the whole batch up front,
+    retrieval and model calls go through `generate_posts`, and the posts, channel
+    logs and last_run_at updates are written in one statement each.
+    Returns the number of posts created.
+    """
+    logs = []
+    jobs = []
+    async with async_session_maker() as session:
+        channels = await channel_queries.get_channels_by_ids_query(
+            ids=list({item["channel_id"] for item in items}),
+            session=session,
+            options=channel_queries.CHANNEL_WITH_COMPANY,
+        )
+        channels = {channel.id: channel for channel in channels}
+        schedulers = await ai_queries.get_scheduled_ai_posts_by_ids_query(
+            ids=[item["scheduler_id"] for item in items],
+            session=session,
+        )
+        schedulers = {scheduler.id: scheduler for scheduler in schedulers}
+        ai_configs = await ai_queries.get_or_create_ai_configs_query(
+            channels=[(item["company_id"], item["channel_id"]) for item in items],
+            session=session,
+        )
+
+        for item in items:
+            channel = channels.get(item["channel_id"])
+            scheduler = schedulers.get(item["scheduler_id"])
+            ai_config = ai_configs.get(item["channel_id"])
+            if not channel or channel.company_id != item["company_id"] or not scheduler or not ai_config:
+                logger.error(f"Scheduler {item['scheduler_id']}: channel, scheduler or AI config not found.")
+                continue
+
+            rate_limit = await check_rate_limit(
+                channel=channel,
+                action="ai_generate",
+                raise_exception=False,
+            )
+            if not rate_limit:
+                logs.append({"channel_id": channel.id, "action": None, "message": "AI generation failed. Rate limit exceeded."})
+                continue
+
+            # usage is one conditional counter update per generation, it has to stay atomic per item.
+            # Its own session: the rollback of a failed charge would expire the batch's channels.
+            try:
+                async with async_session_maker() as usage_session:
+                    success, message = await check_and_consume_usage(
+                        db=usage_session,
+                        company=channel.company,
+                        action="ai",
+                        raise_exception=False,
+                    )
+            except Exception as e:
+                logger.error(f"Error while consuming usage for scheduler {item['scheduler_id']}: {e}")
+                success, message = False, None
+            if not success:
+                # a generation refused for usage doesn't count against the rate limit
+                await release_rate_limit(rate_limit)
+                if message:
+                    logs.append({"channel_id": channel.id, "action": None, "message": f"AI generation failed. {message}"})
+                continue
+
+            prompt = await add_ai_config_prompt(get_channel_prompt(channel), ai_config)
+            jobs.append((item, scheduler.timezone, {
+                "additional_kwargs": {
+                    "prompt": prompt,
+                    "channel_id": channel.id,
+                    "company_id": channel.company_id,
+                    "topic": None,
+                    "random": True
+                }
+            }))
+
+    # no connection is held while the model runs
+    try:
+        results = await generate_posts([input_values for _, _, input_values in jobs])
+    except Exception as e:
+        logger.error(f"Error in generate_scheduled_posts: {e}")
+        results = [e] * len(jobs)
+
+    now = datetime.now()
+    posts = []
+    ran = []
+    for (item, timezone, input_values), result in zip(jobs, results):
+        topic = input_values["additional_kwargs"]["topic"]
+        if isinstance(result, Exception):
+            logger.error(f"Error in ai_generate_scheduled_post {item['scheduler_id']}: {result}")
+            logs.append({
+                "channel_id": item["channel_id"],
+                "action": None,
+                "message": f"Error while generating post, try again later. Topic: {topic}.",
+            })
+            continue
+        response = result["additional_kwargs"].get("response")
+        if not isinstance(response, str) or len(response) == 0:
+            logs.append({
+                "channel_id": item["channel_id"],
+                "action": None,
+                "message": f"Sorry, I couldn't generate a post by topic {topic}. Please try again.",
+            })
+            continue
+        posts.append({
+            "channel_id": item["channel_id"],
+            "company_id": item["company_id"],
+            "content": response,
+            "ai_generated": True,
+            "timezone": timezone,
+            "scheduled_time": now,
+            "status": "scheduled" if not draft else "draft",
+        })
+        logs.append({"channel_id": item["channel_id"], "action": "ai_generate", "message": "AI generated post successfully."})
+        ran.append(item["scheduler_id"])
+
+    async with async_session_maker() as session:
+        created = await post_queries.create_posts_query(data=posts, session=session)
+        await channel_queries.create_channel_logs_query(data=logs, session=session)
+        if ran:
+            await ai_queries.update_scheduled_ai_posts_query(ids=ran, data={"last_run_at": now}, session=session)
+    return created
@@ -1,6 +1,7 @@
-from datetime import datetime
+from datetime import datetime, time
 from typing import Optional, Dict, Any, Literal, List
 
+import pytz
 from pydantic import BaseModel, field_validator
 
 
@@ -29,6 +30,7 @@ class SourcesInSchema(BaseModel):
     document_id: str
     channel_id: int
     company_id: int
+    content_hash: Optional[str] = None
 
 
 class SourcesOutSchema(BaseModel):
@@ -42,7 +44,8 @@ class SourcesOutSchema(BaseModel):
 
 class SourcesListSchema(BaseModel):
     sources: list[SourcesOutSchema]
-    total: int
+    total: Optional[int] = None  # capped at PAGINATION_COUNT_CAP, None when with_total=false
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -110,8 +113,20 @@ class ScheduledAIPostInSchema(BaseModel):
     @field_validator("times")
     @classmethod
     def validate_times(cls, value):
-        if not all(isinstance(time, str) and len(time) == 5 and time[2] == ":" for time in value):
-            raise ValueError("Times must be in HH:MM format.")
+        for value_time in value:
+            if not isinstance(value_time, str) or len(value_time) != 5 or value_time[2] != ":":
+                raise ValueError("Times must be in HH:MM format.")
+            try:
+                time.fromisoformat(value_time)
+            except ValueError:
+                raise ValueError(f"Invalid time {value_time}.")
+        return value
+
+    @field_validator("timezone")
+    @classmethod
+    def validate_timezone(cls, value):
+        if value and value not in pytz.all_timezones:
+            raise ValueError("Invalid timezone.")
         return value
 
 
@@ -121,6 +136,7 @@ class ScheduledAIPostOutSchema(BaseModel):
     times: List[str]  # ["08:00", "12:00", "18:00"]
     is_active: bool = True
     last_run_at: datetime
+    next_run_at: Optional[datetime] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import traceback
+from typing import AsyncIterator, Set
+
+from app.ai.graph import stream_post
+from app.channels.queries import create_channel_log_query
+from app.database import async_session_maker
+from app.posts.queries import create_post_query
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# generations run apart from their response, kept here until they finish
+_generations: Set[asyncio.Task] = set()
+
+
+async def generate_post(input_values: dict, events: asyncio.Queue):
+    """
+    Run one generation, save the post and the channel log like ai_generate_post_task
+    does, and put its SSE events on `events`: `token` events with the text as it is
+    generated, then `done` with the id of the saved post, or `error`, then None.
+    """
+    kwargs = input_values["additional_kwargs"]
+    try:
+        try:
+            async for text in stream_post(input_values):
+                events.put_nowait(sse_event("token", {"text": text}))
+        except Exception as e:
+            traceback.print_exc()
+            async with async_session_maker() as session:
+                await create_channel_log_query(
+                    data={
+                        "channel_id": kwargs["channel_id"],
+                        "message": f"Error while generating post, try again later. Topic: {kwargs['topic']}.",
+                    },
+                    session=session,
+                )
+            events.put_nowait(sse_event("error", {"detail": "Error while generating post, try again later."}))
+            return
+
+        response = kwargs.get("response")
+        # the request's session is closed once the response starts, write with a new one
+        async with async_session_maker() as session:
+            if not isinstance(response, str) or len(response) == 0:
+                await create_channel_log_query(
+                    data={
+                        "channel_id": kwargs["channel_id"],
+                        "message": f"Sorry, I couldn't generate a post by topic {kwargs['topic']}. Please try again.",
+                    },
+                    session=session,
+                )
+                events.put_nowait(sse_event("error", {"detail": "Sorry, I couldn't generate a post. Please try again."}))
+                return
+            post = await create_post_query(
+                data={
+                    "channel_id": kwargs["channel_id"],
+                    "company_id": kwargs["company_id"],
+                    "content": response,
+                    "ai_generated": True,
+                    "timezone": kwargs["timezone"],
+                },
+                session=session,
+            )
+            await create_channel_log_query(
+                data={
+                    "channel_id": kwargs["channel_id"],
+                    "action": "ai_generate",
+                    "message": f"AI generated post successfully.",
+                },
+                session=session,
+            )
+        if post is None:
+            events.put_nowait(sse_event("error", {"detail": "Post could not be saved, try again later."}))
+            return
+        events.put_nowait(sse_event("done", {"post_id": post.id}))
+    except Exception as e:
+        traceback.print_exc()
+        events.put_nowait(sse_event("error", {"detail": "Error while generating post, try again later."}))
+    finally:
+        events.put_nowait(None)
+
+
+async def stream_generated_post(input_values: dict) -> AsyncIterator[str]:
+    """
+    Server-Sent Events of one generation, see generate_post. The usage is already
+    charged, so the generation runs in its own task: a client that disconnects
+    stops getting events, the post is still generated and saved.
+    """
+    events = asyncio.Queue()
+    task = asyncio.create_task(generate_post(input_values, events))
+    _generations.add(task)
+    task.add_done_callback(_generations.discard)
+    while True:
+        event = await events.get()
+        if event is None:
+            return
+        yield event
@@ -1,4 +1,10 @@
-from app.ai.models import AIConfig
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from app.ai import queries as ai_queries
+from app.ai.models import AIConfig, Source
 
 
 async def add_ai_config_prompt(prompt: str, config: AIConfig) -> str:
@@ -16,3 +22,19 @@ async def add_ai_config_prompt(prompt: str, config: AIConfig) -> str:
         prompt += f"\nCustom instructions: {config.custom_instructions}"
     return prompt
 
+
+
+async def find_duplicate_source(channel_id: int, company_id: int, content_hash: str, session: AsyncSession) -> Optional[Source]:
+    """
+    Look for an already ingested copy of the same content. Raises 409 if the channel has it,
+    returns a source of another channel of the company that can be reused, or None.
+    """
+    sources = await ai_queries.get_sources_by_content_hash_query(
+        company_id=company_id,
+        content_hash=content_hash,
+        session=session,
+    )
+    for source in sources:
+        if source.channel_id == channel_id:
+            raise HTTPException(status_code=409, detail="This content is already uploaded to the channel.")
+    return sources[0] if sources else None
@@ -7,8 +7,7 @@ from datetime import datetime, timedelta
 from app import config
 from app.database import get_session
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from app.users import models as user_models, queries as user_queries
-from app.auth import models as auth_models, queries as auth_queries
+from app.auth.cache import AuthSnapshot, UserSnapshot, get_auth_snapshot
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/swagger/token")
@@ -61,7 +60,7 @@ def decode_access_token(token: str):
 
 async def get_current_auth_session(
     token: str = Depends(oauth2_scheme), db_session: AsyncSession = Depends(get_session)
-):
+) -> AuthSnapshot:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -72,7 +71,7 @@ async def get_current_auth_session(
         token_session: str = payload.get("jti")
         if token_session is None:
             raise credentials_exception
-        auth_session = await auth_queries.get_auth_session(token_session, db_session)
+        auth_session = await get_auth_snapshot(token_session, db_session)
         if not auth_session:
             raise credentials_exception
         return auth_session
@@ -81,9 +80,8 @@ async def get_current_auth_session(
 
 
 async def get_current_user(
-    auth_session: str = Depends(get_current_auth_session),
-    db_session: AsyncSession = Depends(get_session)
-):
+    auth_session: AuthSnapshot = Depends(get_current_auth_session),
+) -> UserSnapshot:
     credentials_exception = HTTPException(
         status_code=401,
         detail="Could not validate credentials",
@@ -98,7 +96,7 @@ async def get_current_user(
 
 
 async def get_current_active_user(
-    current_user: Annotated[user_models.User, Depends(get_current_user)],
+    current_user: Annotated[UserSnapshot, Depends(get_current_user)],
 ):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -106,7 +104,7 @@ async def get_current_active_user(
 
 
 async def get_current_superuser(
-    current_user: Annotated[user_models.User, Depends(get_current_user)],
+    current_user: Annotated[UserSnapshot, Depends(get_current_user)],
 ):
     if not current_user.is_superuser:
         raise HTTPException(status_code=400, detail="Not a superuser")
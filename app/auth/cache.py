@@ -0,0 +1,175 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from app import config
+from app.auth import queries as auth_queries
+from app.cache import TTLCache, get_redis
+
+
+class PlanSnapshot(BaseModel):
+    id: int
+    name: str
+    price: Optional[int] = None
+    send_post_limit: int
+    ai_generation_limit: int
+    channels_limit: int
+    knowledge_base_limit: Optional[int] = None
+    ai_enabled: bool
+    is_active: bool
+    is_trial: bool
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+class CompanySnapshot(BaseModel):
+    id: int
+    name: str
+    current_plan_id: Optional[int] = None
+    plan_started_at: Optional[datetime] = None
+    balance_tokens: int = 0
+    referral_code: Optional[str] = None
+    referred_by_id: Optional[int] = None
+    last_payment_at: Optional[datetime] = None
+    subscription_valid_until: Optional[datetime] = None
+    payment_service: Optional[str] = None
+    current_plan: Optional[PlanSnapshot] = None
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+class UserSettingsSnapshot(BaseModel):
+    id: int
+    timezone: Optional[str] = None
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+class UserSnapshot(BaseModel):
+    """
+    What request handlers need of the current user. No password hash, load the user for that.
+    """
+    id: int
+    email: str
+    full_name: Optional[str] = None
+    is_active: bool
+    role: Optional[str] = None
+    is_superuser: bool
+    company_id: int
+    created_at: datetime
+    last_login: Optional[datetime] = None
+    settings: Optional[UserSettingsSnapshot] = None
+    company: CompanySnapshot
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+class AuthSnapshot(BaseModel):
+    token: str
+    user_id: int
+    expired_at: Optional[datetime] = None
+    user: UserSnapshot
+
+    model_config = {
+        "from_attributes": True,
+    }
+
+
+# Level 1 is per process and short lived, so invalidation reaches other processes
+# within AUTH_LOCAL_CACHE_TTL. Level 2 is Redis, shared and invalidated at once.
+_local = TTLCache(max_size=config.AUTH_LOCAL_CACHE_SIZE, ttl=config.AUTH_LOCAL_CACHE_TTL)
+
+
+def _key(jti: str) -> str:
+    return f"auth:{jti}"
+
+
+def _user_index(user_id: int) -> str:
+    return f"auth:user:{user_id}"
+
+
+def _company_index(company_id: int) -> str:
+    return f"auth:company:{company_id}"
+
+
+async def get_auth_snapshot(jti: str, db_session: AsyncSession) -> Optional[AuthSnapshot]:
+    """
+    Auth session with its user, company and plan for a token id. Served from memory or
+    Redis when possible; otherwise loaded from the database and cached.
+    """
+    snapshot = _local.get(jti)
+    if snapshot is not None:
+        return snapshot
+
+    redis = get_redis()
+    try:
+        data = await redis.get(_key(jti))
+    except Exception as e:
+        print(f"Auth cache unavailable: {e}")
+        data = None
+    if data is not None:
+        snapshot = AuthSnapshot.model_validate_json(data)
+        _local.set(jti, snapshot)
+        return snapshot
+
+    auth_session = await auth_queries.get_auth_session(
+        jti, db_session, options=auth_queries.AUTH_SESSION_WITH_USER,
+    )
+    if not auth_session:
+        return None
+    snapshot = AuthSnapshot.model_validate(auth_session)
+    _local.set(jti, snapshot)
+    try:
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(_key(jti), snapshot.model_dump_json(), ex=config.AUTH_CACHE_TTL)
+            for index in (_user_index(snapshot.user_id), _company_index(snapshot.user.company_id)):
+                pipe.sadd(index, jti)
+                pipe.expire(index, config.AUTH_CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Auth cache unavailable: {e}")
+    return snapshot
+
+
+async def _invalidate_index(index: str):
+    redis = get_redis()
+    try:
+        tokens = [token.decode() for token in await redis.smembers(index)]
+        for token in tokens:
+            _local.pop(token)
+        await redis.delete(index, *(_key(token) for token in tokens))
+    except Exception as e:
+        print(f"Auth cache unavailable, {index} not invalidated: {e}")
+
+
+async def invalidate_token(jti: str):
+    _local.pop(jti)
+    try:
+        await get_redis().delete(_key(jti))
+    except Exception as e:
+        print(f"Auth cache unavailable, {jti} not invalidated: {e}")
+
+
+async def invalidate_user(user_id: int):
+    """
+    Drop cached sessions of a user, after a password or profile change.
+    """
+    await _invalidate_index(_user_index(user_id))
+
+
+async def invalidate_companies(company_ids: Iterable[int]):
+    """
+    Drop cached sessions of every user of the companies, after a plan or balance change.
+    """
+    for company_id in set(company_ids):
+        await _invalidate_index(_company_index(company_id))
@@ -11,8 +11,8 @@ class AuthSession(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
-    token: Mapped[str] = mapped_column()
+    token: Mapped[str] = mapped_column(index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())
     expired_at: Mapped[datetime] = mapped_column(DateTime())
 
-    user: Mapped["User"] = relationship(back_populates="auth_session", lazy="selectin")
+    user: Mapped["User"] = relationship(back_populates="auth_session", lazy="raise")
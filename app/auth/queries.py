@@ -1,7 +1,16 @@
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import joinedload
+
 from app.auth.models import AuthSession
+from app.users.models import User, Company
 from sqlalchemy import select, insert, delete
 
+# loader profiles, relationships load nothing unless a query asks for it
+AUTH_SESSION_WITH_USER = (
+    joinedload(AuthSession.user).joinedload(User.settings),
+    joinedload(AuthSession.user).joinedload(User.company).joinedload(Company.current_plan),
+)
+
 
 async def create_auth_session(data: dict, session: AsyncSession) -> AuthSession:
     try:
@@ -13,9 +22,9 @@ async def create_auth_session(data: dict, session: AsyncSession) -> AuthSession:
         print(f"Error create auth session - {data}")
 
 
-async def get_auth_session(token, session: AsyncSession) -> AuthSession:
+async def get_auth_session(token, session: AsyncSession, options: tuple = ()) -> AuthSession:
     try:
-        stmt = select(AuthSession).where(AuthSession.token == token)
+        stmt = select(AuthSession).where(AuthSession.token == token).options(*options)
         result = await session.execute(stmt)
         return result.scalars().first()
     except Exception as e:
@@ -26,6 +35,7 @@ async def delete_auth_session(token, session: AsyncSession) -> bool:
     try:
         stmt = delete(AuthSession).where(AuthSession.token == token)
         result = await session.execute(stmt)
+        await session.commit()
         return bool(result.rowcount)
     except Exception as e:
         print(f"Error deleting auth session - {token}")
@@ -4,7 +4,8 @@ from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth import auth as auth_tools
-from app.auth import models as auth_models, queries as auth_queries, schemas as auth_schemas
+from app.auth import queries as auth_queries, schemas as auth_schemas
+from app.auth import cache as auth_cache
 from app.users import models as user_models, queries as user_queries, schemas as user_schemas
 from app.billing import models as billing_models
 from app.billing import queries as billing_queries
@@ -144,12 +145,13 @@ async def refresh_api(
     "/logout", response_model=base_schemas.SuccessResponseSchema, tags=["auth"]
 )
 async def logout_api(
-    auth_session: auth_models.AuthSession = Depends(
+    auth_session: auth_cache.AuthSnapshot = Depends(
         auth_tools.get_current_auth_session
     ),
     db_session: AsyncSession = Depends(get_session),
 ):
     await auth_queries.delete_auth_session(auth_session.token, db_session)
+    await auth_cache.invalidate_token(auth_session.token)
     return {"message": "Success!"}
 
 
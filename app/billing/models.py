@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import ForeignKey, DateTime, JSON, select, String, Enum
+from sqlalchemy import ForeignKey, Date, DateTime, JSON, select, String, Enum, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -25,7 +25,7 @@ class Plan(Base):
     is_active: Mapped[bool] = mapped_column(default=True)
     is_trial: Mapped[bool] = mapped_column(default=False)
 
-    companies: Mapped["Company"] = relationship(back_populates="current_plan", lazy="selectin")
+    companies: Mapped["Company"] = relationship(back_populates="current_plan", lazy="raise")
 
 
 class OneTimePlan(Base):
@@ -40,13 +40,36 @@ class OneTimePlan(Base):
 
 class Usage(Base):
     __tablename__ = "usages"
+    __table_args__ = (
+        Index("ix_usages_company_id_action_type_created_at", "company_id", "action_type", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
     action_type: Mapped[str] = mapped_column(String, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())
 
-    company: Mapped["Company"] = relationship(back_populates="usages", lazy="selectin")
+    company: Mapped["Company"] = relationship(back_populates="usages", lazy="raise")
+
+
+class UsageCounter(Base):
+    __tablename__ = "usage_counters"
+
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    period_start: Mapped[datetime] = mapped_column(DateTime(), primary_key=True)  # company.last_payment_at when the period began
+    action_type: Mapped[str] = mapped_column(String, primary_key=True)  # post, ai
+    used: Mapped[int] = mapped_column(nullable=False, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now(), onupdate=func.now())
+
+
+class UsageDaily(Base):
+    # raw usages of finished days, rolled up and deleted by rollup_usages_task
+    __tablename__ = "usage_daily"
+
+    company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    action_type: Mapped[str] = mapped_column(String, primary_key=True)  # post, ai
+    day: Mapped[date] = mapped_column(Date(), primary_key=True)
+    count: Mapped[int] = mapped_column(nullable=False, server_default="0")
 
 
 class Referral(Base):
@@ -58,15 +81,18 @@ class Referral(Base):
     reward_given: Mapped[bool] = mapped_column(default=False)
 
     referrer: Mapped["Company"] = relationship(
-        "Company", back_populates="referrals", foreign_keys=[referrer_id], lazy="selectin"
+        "Company", back_populates="referrals", foreign_keys=[referrer_id], lazy="raise"
     )
     referred: Mapped["Company"] = relationship(
-        "Company", back_populates="referred", foreign_keys=[referred_id], lazy="selectin"
+        "Company", back_populates="referred", foreign_keys=[referred_id], lazy="raise"
     )
 
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        Index("ix_payments_company_id_created_at_id", "company_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
@@ -77,5 +103,5 @@ class Payment(Base):
     payment_service: Mapped[str] = mapped_column(String, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())
 
-    company: Mapped["Company"] = relationship(back_populates="payments", lazy="selectin")
+    company: Mapped["Company"] = relationship(back_populates="payments", lazy="raise")
 
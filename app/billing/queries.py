@@ -1,9 +1,12 @@
-from app.billing.models import Plan, Referral, Payment, Usage
-from datetime import datetime
-from typing import List
+from app.billing.models import Plan, Referral, Payment, Usage, UsageCounter, UsageDaily
+from app.users.models import Company
+from datetime import datetime, time, timedelta
+from typing import List, Optional
 
 from sqlalchemy.ext.asyncio.session import AsyncSession
-from sqlalchemy import select, insert, delete, update, func
+from sqlalchemy import select, insert, delete, update, func, cast, bindparam, text, Date, DateTime, Integer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.pagination import Cursor, capped_count, page_items, paginate
 import traceback
 
 
@@ -52,29 +55,119 @@ async def create_referral_query(
         traceback.print_exc()
 
 
-async def get_payments_query(company_id: int, page: int, limit: int, session: AsyncSession) -> tuple[List[Payment], int]:
+async def get_payments_query(
+    company_id: int,
+    page: int,
+    limit: int,
+    session: AsyncSession,
+    after: Optional[Cursor] = None,
+    with_total: bool = True,
+) -> tuple[List[Payment], Optional[int], Optional[str]]:
     try:
-        page = max(page, 1)
-        stmt = (
+        stmt = paginate(
             select(Payment)
-            .where(Payment.company_id == company_id)
-            .offset((page - 1) * limit)
-            .limit(limit).order_by(Payment.created_at.desc())
+            .where(Payment.company_id == company_id),
+            Payment, page, limit, after,
         )
         result = await session.execute(stmt)
-        payments = result.scalars().all()
+        payments, next_cursor = page_items(result.scalars().all(), limit)
+
+        total_count = None
+        if with_total:
+            count_stmt = (
+                select(Payment.id)
+                .where(Payment.company_id == company_id)
+            )
+            total_count = await capped_count(count_stmt, session)
+
+        return payments, total_count, next_cursor
+    except Exception as e:
+        traceback.print_exc()
+        return [], 0, None
 
-        count_stmt = (
-            select(func.count(Payment.id))
-            .where(Payment.company_id == company_id)
+async def get_usage_daily_query(
+    company_id: int,
+    session: AsyncSession,
+    start_date: datetime = None,
+    end_date: datetime = None
+) -> List[dict]:
+    """
+    Usage per day and action: rolled up days from usage_daily plus the raw usages
+    not rolled up yet. Days are whole, the day of start_date counts completely.
+    """
+    try:
+        rollup = (
+            select(UsageDaily.day, UsageDaily.action_type, UsageDaily.count)
+            .where(UsageDaily.company_id == company_id)
+        )
+        tail = (
+            select(
+                cast(Usage.created_at, Date).label("day"),
+                Usage.action_type,
+                func.count().label("count"),
+            )
+            .where(Usage.company_id == company_id)
+            .group_by(cast(Usage.created_at, Date), Usage.action_type)
         )
-        count_result = await session.execute(count_stmt)
-        total_count = count_result.scalar_one()
+        # the raw tail is cut at day boundaries too, the rollup has no time of day
+        if start_date:
+            rollup = rollup.where(UsageDaily.day >= start_date.date())
+            tail = tail.where(Usage.created_at >= datetime.combine(start_date.date(), time.min))
+        if end_date:
+            rollup = rollup.where(UsageDaily.day <= end_date.date())
+            tail = tail.where(Usage.created_at < datetime.combine(end_date.date() + timedelta(days=1), time.min))
 
-        return payments, total_count
+        # a day can be in both while the rollup job runs
+        days = rollup.union_all(tail).subquery()
+        stmt = (
+            select(days.c.day, days.c.action_type, func.sum(days.c["count"]).label("count"))
+            .group_by(days.c.day, days.c.action_type)
+            .order_by(days.c.day, days.c.action_type)
+        )
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings().all()]
     except Exception as e:
         traceback.print_exc()
-        return [], 0
+        return []
+
+
+ROLLUP_USAGES_SQL = text("""
+WITH moved AS (
+    DELETE FROM usages
+    WHERE id IN (
+        SELECT id FROM usages
+        WHERE created_at < :before
+        ORDER BY id
+        LIMIT :batch_size
+    )
+    RETURNING company_id, action_type, created_at
+), days AS (
+    INSERT INTO usage_daily (company_id, action_type, day, count)
+    SELECT company_id, action_type, created_at::date, count(*)
+    FROM moved
+    GROUP BY company_id, action_type, created_at::date
+    ON CONFLICT (company_id, action_type, day) DO UPDATE SET count = usage_daily.count + EXCLUDED.count
+)
+SELECT count(*) FROM moved
+""").bindparams(bindparam("before", type_=DateTime()), bindparam("batch_size", type_=Integer()))
+
+
+async def rollup_usages_query(before: datetime, batch_size: int, session: AsyncSession) -> int:
+    """
+    Move up to `batch_size` raw usages older than `before` into usage_daily, in one
+    statement so a row is either counted in the rollup or still raw, never both.
+    Returns the number of rows moved.
+    """
+    try:
+        result = await session.execute(ROLLUP_USAGES_SQL, {"before": before, "batch_size": batch_size})
+        moved = result.scalar_one()
+        await session.commit()
+        return moved
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return 0
+
 
 async def get_usages_by_company_id_timeframe_query(
     company_id: int,
@@ -100,3 +193,68 @@ async def get_usages_by_company_id_timeframe_query(
         traceback.print_exc()
         return []
 
+
+
+# The usage queries below don't commit, check_and_consume_usage runs them in one transaction.
+
+async def increment_usage_counter_query(
+    company_id: int,
+    period_start: datetime,
+    action: str,
+    session: AsyncSession,
+    limit: Optional[int] = None,
+) -> Optional[int]:
+    """
+    Atomically add one use to the counter, only while it is below `limit` when given.
+    Returns the new value, or None if the counter is missing or the limit is reached.
+    """
+    stmt = (
+        update(UsageCounter)
+        .where(UsageCounter.company_id == company_id)
+        .where(UsageCounter.period_start == period_start)
+        .where(UsageCounter.action_type == action)
+        .values(used=UsageCounter.used + 1)
+        .returning(UsageCounter.used)
+        .execution_options(synchronize_session=False)
+    )
+    if limit is not None:
+        stmt = stmt.where(UsageCounter.used < limit)
+    result = await session.execute(stmt)
+    return result.scalar()
+
+
+async def create_usage_counter_query(company_id: int, period_start: datetime, action: str, session: AsyncSession):
+    await session.execute(
+        pg_insert(UsageCounter)
+        .values(company_id=company_id, period_start=period_start, action_type=action, used=0)
+        .on_conflict_do_nothing(index_elements=["company_id", "period_start", "action_type"])
+    )
+
+
+async def consume_balance_token_query(company_id: int, session: AsyncSession) -> Optional[int]:
+    """
+    Atomically take one token from the company balance. Returns the new balance, or None if it is empty.
+    """
+    result = await session.execute(
+        update(Company)
+        .where(Company.id == company_id)
+        .where(Company.balance_tokens > 0)
+        .values(balance_tokens=Company.balance_tokens - 1)
+        .returning(Company.balance_tokens)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalar()
+
+
+async def get_usage_counters_query(company_id: int, period_start: datetime, session: AsyncSession) -> List[UsageCounter]:
+    try:
+        stmt = (
+            select(UsageCounter)
+            .where(UsageCounter.company_id == company_id)
+            .where(UsageCounter.period_start == period_start)
+        )
+        result = await session.execute(stmt)
+        return result.scalars().all()
+    except Exception as e:
+        traceback.print_exc()
+        return []
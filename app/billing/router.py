@@ -1,13 +1,14 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth import auth as auth_tools
+from app.auth.cache import UserSnapshot
 from app.billing.schemas import SubscriptionOutSchema
-from app.users import models as user_models
 from app.billing import schemas as billing_schemas
 from app.billing import queries as billing_queries
 from app.database import get_session
+from app.pagination import decode_cursor
 
 
 router = APIRouter()
@@ -16,7 +17,7 @@ router = APIRouter()
 @router.get("/subscription", response_model=billing_schemas.SubscriptionOutSchema)
 async def get_subscription(
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     usages = await billing_queries.get_usages_by_company_id_timeframe_query(
         company_id=user.company.id,
@@ -24,9 +25,16 @@ async def get_subscription(
         start_date=user.company.last_payment_at,
         end_date=user.company.subscription_valid_until
     )
+    daily_usage = await billing_queries.get_usage_daily_query(
+        company_id=user.company.id,
+        session=session,
+        start_date=user.company.last_payment_at,
+        end_date=user.company.subscription_valid_until
+    )
     model = SubscriptionOutSchema(
         plan=user.company.current_plan,
         usages=usages,
+        daily_usage=daily_usage,
         plan_started_at=user.company.plan_started_at,
         balance_tokens=user.company.balance_tokens,
         referral_code=user.company.referral_code,
@@ -42,18 +50,23 @@ async def get_subscription(
 async def get_payments(
     page: int = 1,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
-    payments, total = await billing_queries.get_payments_query(
+    payments, total, next_cursor = await billing_queries.get_payments_query(
         company_id=user.company.id,
         page=page,
         limit=limit,
-        session=session
+        session=session,
+        after=decode_cursor(cursor),
+        with_total=with_total,
     )
     return billing_schemas.PaymentListSchema(
         payments=payments,
-        total=total
+        total=total,
+        next_cursor=next_cursor,
     )
 
 
@@ -61,7 +74,7 @@ async def get_payments(
 async def add_balance(
     data: billing_schemas.AddBalanceSchema,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     # if amount <= 0:
     #     raise HTTPException(status_code=400, detail="Amount must be greater than zero.")
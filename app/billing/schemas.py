@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List, Literal
 
 from pydantic import BaseModel
@@ -18,6 +18,12 @@ class UsageOutSchema(BaseModel):
     }
 
 
+class UsageDailyOutSchema(BaseModel):
+    day: date
+    action_type: str
+    count: int
+
+
 class PlanOutSchema(BaseModel):
     id: int
     name: str
@@ -43,7 +49,8 @@ class SubscriptionOutSchema(BaseModel):
     subscription_valid_until: Optional[datetime] = None
     payment_service: Optional[str] = None
     plan: PlanOutSchema
-    usages: List[UsageOutSchema] = []
+    usages: List[UsageOutSchema] = []  # raw usages not rolled up yet, usually only today's
+    daily_usage: List[UsageDailyOutSchema] = []
 
     model_config = {
         "from_attributes": True,
@@ -66,7 +73,8 @@ class PaymentOutSchema(BaseModel):
 
 class PaymentListSchema(BaseModel):
     payments: List[PaymentOutSchema]
-    total: int
+    total: Optional[int] = None  # capped at PAGINATION_COUNT_CAP, None when with_total=false
+    next_cursor: Optional[str] = None
 
     model_config = {
         "from_attributes": True,
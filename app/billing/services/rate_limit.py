@@ -1,41 +1,128 @@
 
-from datetime import datetime, timedelta
+import math
+from dataclasses import dataclass
+from typing import Optional
+from uuid import uuid4
+
 from app import config
+from app.cache import get_redis
 from fastapi import HTTPException
 from sqlalchemy import select, func
+from redis.exceptions import RedisError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.billing.models import Plan
-from app.channels.models import Channel,ChannelLog
+from app.channels.models import Channel
 from app.ai.models import Source
 from app.users.models import Company
 
 
+# Sliding window log: one sorted set member per allowed action, scored by its time in ms.
+# Returns {allowed, remaining, ms until the oldest action leaves the window}.
+#
+# KEYS: window key
+# ARGV: limit, window (ms), unique member
+SLIDING_WINDOW_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + 1
+    allowed = 1
+end
+
+local reset = 0
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = math.max(0, tonumber(oldest[2]) + window - now)
+end
+return {allowed, math.max(0, limit - count), reset}
+"""
+
+
+@dataclass
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_after: float  # seconds until a slot frees up
+    key: Optional[str] = None  # window and member of the slot taken, to release it
+    member: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return self.allowed
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Retry-After": str(math.ceil(self.reset_after)),
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+
+
+async def hit_rate_limit(key: str, limit: int, window: int = None) -> RateLimitResult:
+    """
+    Take one slot of `limit` per `window` seconds for `key`, atomically across all processes.
+    """
+    window = window or config.RATE_LIMIT_WINDOW_SECONDS
+    if limit <= 0:
+        return RateLimitResult(allowed=False, limit=limit, remaining=0, reset_after=window)
+    member = uuid4().hex
+    try:
+        allowed, remaining, reset_ms = await get_redis().eval(
+            SLIDING_WINDOW_SCRIPT, 1, f"rl:{key}", limit, window * 1000, member,
+        )
+    except RedisError as e:
+        # don't take the API down with the limiter
+        print(f"Rate limiter unavailable, allowing {key}: {e}")
+        return RateLimitResult(allowed=True, limit=limit, remaining=limit, reset_after=0)
+    return RateLimitResult(
+        allowed=bool(allowed), limit=limit, remaining=int(remaining), reset_after=int(reset_ms) / 1000,
+        key=f"rl:{key}", member=member,
+    )
+
+
+async def release_rate_limit(result: RateLimitResult):
+    """
+    Give back the slot taken by `result`, for an action refused after the rate limit check.
+    """
+    if not result or not result.member:
+        return
+    try:
+        await get_redis().zrem(result.key, result.member)
+    except RedisError as e:
+        print(f"Rate limiter unavailable, slot of {result.key} not released: {e}")
+
+
 async def check_rate_limit(
-    db: AsyncSession,
     channel: Channel,
     action: str,
     raise_exception: bool = True,
-):
-    now = datetime.now()
-    window_start = now - timedelta(minutes=1)
-    # Count the number of actions performed in the last minute
-    stmt = select(func.count()).where(
-        ChannelLog.channel_id == channel.id,
-        ChannelLog.action == action,
-        ChannelLog.created_at >= window_start
-    )
-    result = await db.execute(stmt)
-    action_count = result.scalar() or 0
-    limit = config.RATE_LIMITS_PER_MINUTE.get(action, 0)
-    if action_count >= limit:
-        if raise_exception:
-            raise HTTPException(
-                status_code=429,
-                detail=f"Rate limit exceeded. Try again later."
-            )
-        return False
-    return True
+    limit: int = None,
+) -> RateLimitResult:
+    """
+    Per channel and action limit, from RATE_LIMITS_PER_MINUTE unless `limit` is given.
+    The result is falsy when the limit is exceeded.
+    """
+    if limit is None:
+        limit = config.RATE_LIMITS_PER_MINUTE.get(action, 0)
+    result = await hit_rate_limit(f"channel:{channel.id}:{action}", limit)
+    if not result and raise_exception:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Rate limit exceeded. Try again later.",
+            headers=result.headers,
+        )
+    return result
 
 
 async def check_source_rate_limit(
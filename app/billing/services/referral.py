@@ -1,5 +1,6 @@
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.auth.cache import invalidate_companies
 from app.billing.models import Referral
 from app.users.models import Company
 
@@ -24,4 +25,5 @@ async def process_referral_reward(db: AsyncSession, referred_company_id: int):
 
     referrer.balance_tokens += BONUS_TOKENS
     referral.reward_given = True
-    await db.commit()
\ No newline at end of file
+    await db.commit()
+    await invalidate_companies([referrer.id])
\ No newline at end of file
@@ -1,31 +1,32 @@
 from datetime import datetime
+from typing import Awaitable, Callable, Optional
 
 from fastapi import HTTPException
-from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import config
+from app.auth.cache import invalidate_companies
+from app.billing import queries as billing_queries
 from app.billing.models import ActionType, Usage, Plan
 from app.users.models import Company
 
+# period key for companies that never paid, usage_counters.period_start is part of the primary key
+NO_PAYMENT_PERIOD = datetime(1970, 1, 1)
+
+
+def get_usage_period(company: Company) -> datetime:
+    return company.last_payment_at or NO_PAYMENT_PERIOD
+
 
 async def check_and_consume_usage(
     db: AsyncSession,
     company: Company,
     action: str,
     raise_exception: bool = True,
+    before_commit: Optional[Callable[[AsyncSession], Awaitable]] = None,
 ):
     # actions - post, ai
-    month_start = company.last_payment_at
-
-    # count usage for the current month for this company and action
-    stmt = select(func.count()).where(
-        Usage.company_id == company.id,
-        Usage.action_type == action,
-        Usage.created_at >= month_start
-    )
-    result = await db.execute(stmt)
-    usage_count = result.scalar()
-
+    # before_commit runs in the transaction of a successful charge, to record what was charged
     # limits
     plan: Plan = company.current_plan
     if not plan:
@@ -34,21 +35,47 @@ async def check_and_consume_usage(
         return False, "No active plan"
 
     limit = plan.send_post_limit if action == ActionType.POST else plan.ai_generation_limit
-    if usage_count < limit:
-        # everything is ok, we can use the action
-        new_usage = Usage(company_id=company.id, action_type=action)
-        db.add(new_usage)
-        await db.commit()
-        return True, "Usage consumed"
+    period_start = get_usage_period(company)
 
-    # if limit is reached, check if we can use tokens
-    if company.balance_tokens > 0:
-        company.balance_tokens -= 1
-        new_usage = Usage(company_id=company.id, action_type=action)
-        db.add(new_usage)
-        await db.commit()
-        return True, "Usage consumed with tokens"
+    try:
+        # one conditional UPDATE on the counter of the current period, no COUNT(*) over usages
+        used = await billing_queries.increment_usage_counter_query(
+            company_id=company.id, period_start=period_start, action=action, limit=limit, session=db,
+        )
+        if used is None:
+            # first use in the period, or the limit is reached
+            await billing_queries.create_usage_counter_query(
+                company_id=company.id, period_start=period_start, action=action, session=db,
+            )
+            used = await billing_queries.increment_usage_counter_query(
+                company_id=company.id, period_start=period_start, action=action, limit=limit, session=db,
+            )
+
+        used_tokens = used is None
+        if used_tokens:
+            # if limit is reached, check if we can use tokens
+            balance = await billing_queries.consume_balance_token_query(company_id=company.id, session=db)
+            if balance is None:
+                await db.commit()
+                if raise_exception:
+                    raise HTTPException(status_code=402, detail="Usage limit exceeded. Upgrade plan or buy tokens.")
+                return False, "Usage limit exceeded. Upgrade plan or buy tokens."
+            await billing_queries.increment_usage_counter_query(
+                company_id=company.id, period_start=period_start, action=action, session=db,
+            )
 
-    if raise_exception:
-        raise HTTPException(status_code=402, detail="Usage limit exceeded. Upgrade plan or buy tokens.")
-    return False, "Usage limit exceeded. Upgrade plan or buy tokens."
\ No newline at end of file
+        if config.USAGE_AUDIT_LOG:
+            db.add(Usage(company_id=company.id, action_type=action))
+        if before_commit:
+            await before_commit(db)
+        await db.commit()
+        if used_tokens:
+            # cached auth snapshots hold the balance
+            await invalidate_companies([company.id])
+            return True, "Usage consumed with tokens"
+        return True, "Usage consumed"
+    except HTTPException:
+        raise
+    except Exception:
+        await db.rollback()
+        raise
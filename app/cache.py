@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+from app import config
+
+# The client's connection pool is bound to the event loop it was first used on.
+_client: aioredis.Redis = None
+_loop: asyncio.AbstractEventLoop = None
+
+
+def get_redis() -> aioredis.Redis:
+    """
+    Return the process-wide async Redis client for caches and rate limits.
+    """
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _loop is not loop:
+        _client = aioredis.Redis.from_url(config.REDIS_URL)
+        _loop = loop
+    return _client
+
+
+async def close_redis():
+    global _client, _loop
+    if _client is not None and _loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+    _loop = None
+
+
+class TTLCache:
+    """
+    Small in-process LRU with a TTL per entry.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key):
+        self._data.pop(key, None)
+
+
+class RedisLRUCache:
+    """
+    Size-bounded key/value cache in Redis. Entries expire after `ttl` seconds and,
+    once more than `max_entries` are stored, the least recently used ones are evicted.
+    Hits and misses are counted in Redis so the hit rate covers every process.
+    """
+
+    def __init__(self, namespace: str, max_entries: int, ttl: int):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_key = f"{namespace}:lru"
+        self.stats_key = f"{namespace}:stats"
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get_many(self, keys: List[str], count: bool = True) -> List[Optional[bytes]]:
+        """
+        Values of `keys`, None for the missing ones. With `count` off the lookup is
+        not added to hits and misses, for callers that count their own outcome.
+        """
+        if not keys:
+            return []
+        redis = get_redis()
+        values = await redis.mget([self._key(key) for key in keys])
+        hits = [self._key(key) for key, value in zip(keys, values) if value is not None]
+        now = time.time()
+        async with redis.pipeline(transaction=False) as pipe:
+            if hits:
+                pipe.zadd(self.index_key, {key: now for key in hits}, xx=True)
+            if count:
+                pipe.hincrby(self.stats_key, "hits", len(hits))
+                pipe.hincrby(self.stats_key, "misses", len(keys) - len(hits))
+            await pipe.execute()
+        return values
+
+    async def get(self, key: str, count: bool = True) -> Optional[bytes]:
+        return (await self.get_many([key], count=count))[0]
+
+    async def incr_stats(self, **counters: int):
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for name, amount in counters.items():
+                pipe.hincrby(self.stats_key, name, amount)
+            await pipe.execute()
+
+    async def set_many(self, items: Dict[str, bytes]):
+        if not items:
+            return
+        redis = get_redis()
+        now = time.time()
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self._key(key), value, ex=self.ttl)
+            pipe.zadd(self.index_key, {self._key(key): now for key in items})
+            pipe.zcard(self.index_key)
+            size = (await pipe.execute())[-1]
+        if size > self.max_entries:
+            evicted = await redis.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                await redis.delete(*(key for key, _ in evicted))
+
+    async def set(self, key: str, value: bytes):
+        await self.set_many({key: value})
+
+    async def stats(self) -> dict:
+        redis = get_redis()
+        counters = {name.decode(): int(value) for name, value in (await redis.hgetall(self.stats_key)).items()}
+        hits = counters.pop("hits", 0)
+        misses = counters.pop("misses", 0)
+        return {
+            "size": await redis.zcard(self.index_key),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            **counters,  # added with incr_stats
+        }
@@ -11,6 +11,10 @@ beat_schedule = {
         'task': 'app.celery_tasks.remove_old_channel_logs',
         'schedule': crontab(hour=0, minute=0), # every day at midnight
     },
+    'rollup-usages-every-day': {
+        'task': 'app.celery_tasks.rollup_usages_task',
+        'schedule': crontab(hour=0, minute=10),
+    },
     'celery-get-posts-for-loop-every-minute': {
         'task': 'app.celery_tasks.celery_get_posts_for_loop',
         'schedule': crontab(minute='*/1'),  # every minute
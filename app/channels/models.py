@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import ForeignKey, DateTime, JSON, select, String
+from sqlalchemy import ForeignKey, DateTime, JSON, select, String, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 import uuid
@@ -13,6 +13,9 @@ from app.database import async_session_maker
 
 class Channel(Base):
     __tablename__ = "channels"
+    __table_args__ = (
+        Index("ix_channels_company_id_created_at_id", "company_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"))
@@ -21,23 +24,32 @@ class Channel(Base):
     config_json: Mapped[dict] = mapped_column(JSON, nullable=False)  # JSON config for the channel
     created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())
 
-    company: Mapped["Company"] = relationship(back_populates="channels", lazy="selectin")
-    posts: Mapped[List[Post]] = relationship(back_populates="channel", lazy="selectin")
-    logs: Mapped["ChannelLog"] = relationship(back_populates="channel", lazy="selectin")
-    sources: Mapped["Source"] = relationship(back_populates="channel", lazy="selectin")
-    ai_config: Mapped["AIConfig"] = relationship(back_populates="channel", lazy="selectin")
-    scheduled_ai_posts: Mapped["ScheduledAIPost"] = relationship(back_populates="channel", lazy="selectin")
+    company: Mapped["Company"] = relationship(back_populates="channels", lazy="raise")
+    posts: Mapped[List[Post]] = relationship(back_populates="channel", lazy="raise", passive_deletes=True)
+    logs: Mapped["ChannelLog"] = relationship(back_populates="channel", lazy="raise", passive_deletes=True)
+    sources: Mapped["Source"] = relationship(back_populates="channel", lazy="raise", passive_deletes=True)
+    ai_config: Mapped["AIConfig"] = relationship(back_populates="channel", lazy="raise", passive_deletes=True)
+    scheduled_ai_posts: Mapped["ScheduledAIPost"] = relationship(back_populates="channel", lazy="raise", passive_deletes=True)
 
 
 class ChannelLog(Base):
+    # partitioned by day, partitions are created ahead and dropped after the retention
+    # period by remove_old_channel_logs, see channels.queries
     __tablename__ = "channel_logs"
-
-    id: Mapped[int] = mapped_column(primary_key=True)
+    __table_args__ = (
+        Index("ix_channel_logs_channel_id_action_created_at", "channel_id", "action", "created_at"),
+        Index("ix_channel_logs_channel_id_created_at_id", "channel_id", "created_at", "id"),
+        Index("ix_channel_logs_created_at", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     channel_id: Mapped[int] = mapped_column(ForeignKey("channels.id", ondelete="CASCADE"))
     post_id: Mapped[int] = mapped_column(ForeignKey("posts.id", ondelete="CASCADE"), nullable=True)
     message: Mapped[str] = mapped_column(nullable=False)
     action: Mapped[str] = mapped_column(nullable=True)
-    created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())
+    # the partition key has to be part of the primary key
+    created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now(), primary_key=True)
 
-    channel: Mapped["Channel"] = relationship(back_populates="logs", lazy="selectin")
-    post: Mapped["Post"] = relationship(back_populates="logs", lazy="selectin")
\ No newline at end of file
+    channel: Mapped["Channel"] = relationship(back_populates="logs", lazy="raise")
+    post: Mapped["Post"] = relationship(back_populates="logs", lazy="raise")
\ No newline at end of file
@@ -1,12 +1,20 @@
-from datetime import datetime
-from typing import List
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
 
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth.models import AuthSession
-from sqlalchemy import select, insert, delete, update, func
+from sqlalchemy import select, insert, delete, update, func, text
+from sqlalchemy.orm import joinedload
 from app.channels.models import Channel, ChannelLog
+from app.users.models import Company
+from app import config
+from app.pagination import Cursor, capped_count, page_items, paginate
 import traceback
 
+# loader profiles, relationships load nothing unless a query asks for it
+CHANNEL_WITH_COMPANY = (joinedload(Channel.company).joinedload(Company.current_plan),)
+
 
 async def create_channel_query(data: dict, session: AsyncSession) -> Channel:
     try:
@@ -46,12 +54,13 @@ async def delete_channel_query(channel_id: int, session: AsyncSession):
         traceback.print_exc()
 
 
-async def get_channel_query(channel_id: int, company_id: int, session: AsyncSession) -> Channel:
+async def get_channel_query(channel_id: int, company_id: int, session: AsyncSession, options: tuple = ()) -> Channel:
     try:
         stmt = (
             select(Channel)
             .where(Channel.id == channel_id)
             .where(Channel.company_id == company_id)
+            .options(*options)
         )
         result = await session.execute(stmt)
         return result.scalars().first()
@@ -60,29 +69,45 @@ async def get_channel_query(channel_id: int, company_id: int, session: AsyncSess
         return None
 
 
-async def get_channels_query(company_id: int, page: int, limit: int, session: AsyncSession) -> tuple[List[Channel], int]:
+async def get_channels_by_ids_query(ids: List[int], session: AsyncSession, options: tuple = ()) -> List[Channel]:
     try:
-        page = max(page, 1)
-        stmt = (
+        stmt = select(Channel).where(Channel.id.in_(ids)).options(*options)
+        result = await session.execute(stmt)
+        return result.scalars().unique().all()
+    except Exception as e:
+        traceback.print_exc()
+        return []
+
+
+async def get_channels_query(
+    company_id: int,
+    page: int,
+    limit: int,
+    session: AsyncSession,
+    after: Optional[Cursor] = None,
+    with_total: bool = True,
+) -> tuple[List[Channel], Optional[int], Optional[str]]:
+    try:
+        stmt = paginate(
             select(Channel)
-            .where(Channel.company_id == company_id)
-            .offset((page - 1) * limit)
-            .limit(limit).order_by(Channel.created_at.desc())
+            .where(Channel.company_id == company_id),
+            Channel, page, limit, after,
         )
         result = await session.execute(stmt)
-        channels = result.scalars().all()
+        channels, next_cursor = page_items(result.scalars().all(), limit)
 
-        count_stmt = (
-            select(func.count(Channel.id))
-            .where(Channel.company_id == company_id)
-        )
-        count_result = await session.execute(count_stmt)
-        total_count = count_result.scalar_one()
+        total_count = None
+        if with_total:
+            count_stmt = (
+                select(Channel.id)
+                .where(Channel.company_id == company_id)
+            )
+            total_count = await capped_count(count_stmt, session)
 
-        return channels, total_count
+        return channels, total_count, next_cursor
     except Exception as e:
         traceback.print_exc()
-        return [], 0
+        return [], 0, None
 
 
 async def get_last_channels_query(company_id: int, limit: int, session: AsyncSession) -> List[Channel]:
@@ -111,43 +136,134 @@ async def create_channel_log_query(data: dict, session: AsyncSession) -> Channel
         traceback.print_exc()
 
 
-async def get_channel_logs_query(channel_id: int, page: int, limit: int, session: AsyncSession) -> tuple[List[ChannelLog], int]:
+async def create_channel_logs_query(data: List[dict], session: AsyncSession) -> int:
     try:
-        page = max(page, 1)
-        stmt = (
+        if not data:
+            return 0
+        await session.execute(insert(ChannelLog), data)
+        await session.commit()
+        return len(data)
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return 0
+
+
+async def get_channel_logs_query(
+    channel_id: int,
+    page: int,
+    limit: int,
+    session: AsyncSession,
+    after: Optional[Cursor] = None,
+    with_total: bool = True,
+) -> tuple[List[ChannelLog], Optional[int], Optional[str]]:
+    try:
+        stmt = paginate(
             select(ChannelLog)
             .where(ChannelLog.channel_id == channel_id)
-            .offset((page - 1) * limit)
-            .limit(limit).order_by(ChannelLog.created_at.desc())
+            .where(ChannelLog.created_at >= channel_logs_retention_start()),
+            ChannelLog, page, limit, after,
         )
         result = await session.execute(stmt)
-        logs = result.scalars().all()
+        logs, next_cursor = page_items(result.scalars().all(), limit)
 
-        count_stmt = (
-            select(func.count(ChannelLog.id))
-            .where(ChannelLog.channel_id == channel_id)
-        )
-        count_result = await session.execute(count_stmt)
-        total_count = count_result.scalar_one()
+        total_count = None
+        if with_total:
+            count_stmt = (
+                select(ChannelLog.id)
+                .where(ChannelLog.channel_id == channel_id)
+                .where(ChannelLog.created_at >= channel_logs_retention_start())
+            )
+            total_count = await capped_count(count_stmt, session)
 
-        return logs, total_count
+        return logs, total_count, next_cursor
     except Exception as e:
         traceback.print_exc()
-        return [], 0
+        return [], 0, None
+
+
+def channel_log_partition_name(day: date) -> str:
+    return f"channel_logs_p{day:%Y%m%d}"
+
+
+def channel_logs_retention_start() -> datetime:
+    """
+    Oldest created_at still kept. Filtering on it lets the planner skip partitions
+    that wait for the next retention run.
+    """
+    today = datetime.now(tz=timezone.utc).replace(tzinfo=None).date()
+    return datetime.combine(today - timedelta(days=config.CHANNEL_LOGS_RETENTION_DAYS), datetime.min.time())
 
 
-async def delete_channel_logs_by_before_date_query(before_date: datetime, session: AsyncSession):
+async def create_channel_log_partitions_query(days: int, session: AsyncSession) -> List[str]:
+    """
+    Create the daily partitions from yesterday to `days` days ahead that don't exist
+    yet, each in its own transaction, and return their names. Days follow the
+    database's current_date, the one the created_at default is stamped with.
+    """
+    created = []
     try:
-        stmt = delete(ChannelLog).where(
-            ChannelLog.created_at < before_date
-        )
-        await session.execute(stmt)
+        result = await session.execute(text("SELECT current_date"))
+        start = result.scalar() - timedelta(days=1)
         await session.commit()
-        return True
     except Exception as e:
         await session.rollback()
         traceback.print_exc()
-        return False
+        return created
+    for offset in range(days + 2):
+        day = start + timedelta(days=offset)
+        name = channel_log_partition_name(day)
+        try:
+            result = await session.execute(text("SELECT to_regclass(:name)"), {"name": name})
+            if result.scalar() is not None:
+                await session.commit()
+                continue
+            await session.execute(text(
+                f"CREATE TABLE {name} PARTITION OF channel_logs "
+                f"FOR VALUES FROM ('{day}') TO ('{day + timedelta(days=1)}')"
+            ))
+            await session.commit()
+            created.append(name)
+        except Exception as e:
+            # a failed day doesn't undo the others, it is tried again on the next run
+            await session.rollback()
+            traceback.print_exc()
+    return created
+
+
+async def drop_channel_log_partitions_query(before_date: date, session: AsyncSession) -> List[str]:
+    """
+    Detach and drop the daily partitions that end on or before `before_date`.
+
+    Partitions are detached CONCURRENTLY, which can't run in a transaction, so this
+    uses an autocommit connection of its own. A detach interrupted on a previous run
+    is finalized, a partition detached but not dropped is dropped.
+    """
+    dropped = []
+    try:
+        async with session.bind.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            result = await conn.execute(text(
+                "SELECT c.relname, i.inhrelid IS NOT NULL AS attached, coalesce(i.inhdetachpending, false) AS pending "
+                "FROM pg_class c "
+                "LEFT JOIN pg_inherits i ON i.inhrelid = c.oid AND i.inhparent = 'channel_logs'::regclass "
+                "WHERE c.relkind = 'r' AND c.relname ~ '^channel_logs_p[0-9]{8}$'"
+            ))
+            for name, attached, pending in sorted(result.all()):
+                match = re.fullmatch(r"channel_logs_p(\d{8})", name)
+                if datetime.strptime(match.group(1), "%Y%m%d").date() >= before_date:
+                    continue
+                if pending:
+                    await conn.execute(text(f"ALTER TABLE channel_logs DETACH PARTITION {name} FINALIZE"))
+                elif attached:
+                    # no ACCESS EXCLUSIVE lock on channel_logs, inserts and reads go on
+                    await conn.execute(text(f"ALTER TABLE channel_logs DETACH PARTITION {name} CONCURRENTLY"))
+                await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped.append(name)
+        return dropped
+    except Exception as e:
+        traceback.print_exc()
+        return dropped
 
 
 async def get_count_all_channels_query(company_id: int, session: AsyncSession) -> int:
@@ -169,6 +285,7 @@ async def get_last_channels_logs_query(company_id: int, limit: int, session: Asy
             select(ChannelLog)
             .join(Channel)
             .where(Channel.company_id == company_id)
+            .where(ChannelLog.created_at >= channel_logs_retention_start())
             .order_by(ChannelLog.created_at.desc())
             .limit(limit)
         )
@@ -1,10 +1,14 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth import auth as auth_tools
+from app.auth.cache import UserSnapshot
 from app.channels import queries as channel_queries
 from app.channels import schemas as channel_schemas
-from app.users import models as user_models
 from app.database import get_session
+from app.pagination import decode_cursor
+from app.users.dashboard import invalidate_dashboard
 
 
 router = APIRouter()
@@ -14,7 +18,7 @@ router = APIRouter()
 async def create_channel(
     channel: channel_schemas.ChannelInSchema,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Create a new channel.
@@ -24,6 +28,7 @@ async def create_channel(
     new_channel = await channel_queries.create_channel_query(channel_data, session)
     if not new_channel:
         raise HTTPException(status_code=400, detail="Failed to create channel")
+    await invalidate_dashboard(user.company_id)
     return new_channel
 
 
@@ -32,7 +37,7 @@ async def update_channel(
     channel_id: int,
     channel: channel_schemas.ChannelUpdateSchema,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Update an existing channel.
@@ -52,7 +57,7 @@ async def update_channel(
 async def delete_channel(
     channel_id: int,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Delete a channel.
@@ -64,6 +69,7 @@ async def delete_channel(
     deleted = await channel_queries.delete_channel_query(channel_id, session)
     if not deleted:
         raise HTTPException(status_code=400, detail="Failed to delete channel")
+    await invalidate_dashboard(user.company_id)
     return {"message": "Channel deleted successfully"}
 
 
@@ -71,7 +77,7 @@ async def delete_channel(
 async def get_channel(
     channel_id: int,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Get a channel by ID.
@@ -86,14 +92,19 @@ async def get_channel(
 async def list_channels(
     page: int = 1,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
-    List channels with pagination.
+    List channels with pagination, by `cursor` or `page`.
     """
-    channels, total = await channel_queries.get_channels_query(user.company_id, page, limit, session)
-    return {"channels": channels, "total": total}
+    channels, total, next_cursor = await channel_queries.get_channels_query(
+        user.company_id, page, limit, session,
+        after=decode_cursor(cursor), with_total=with_total,
+    )
+    return {"channels": channels, "total": total, "next_cursor": next_cursor}
 
 
 @router.get("/{channel_id}/logs", response_model=channel_schemas.ChannelLogListSchema)
@@ -101,11 +112,16 @@ async def list_channel_logs(
     channel_id: int,
     page: int = 1,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
-    List logs for a specific channel with pagination.
+    List logs for a specific channel with pagination, by `cursor` or `page`.
     """
-    logs, total = await channel_queries.get_channel_logs_query(channel_id, page, limit, session)
-    return {"logs": logs, "total": total}
+    logs, total, next_cursor = await channel_queries.get_channel_logs_query(
+        channel_id, page, limit, session,
+        after=decode_cursor(cursor), with_total=with_total,
+    )
+    return {"logs": logs, "total": total, "next_cursor": next_cursor}
@@ -59,7 +59,8 @@ class ChannelUpdateSchema(BaseModel):
 
 class ChannelListSchema(BaseModel):
     channels: List[ChannelOutSchema]
-    total: int
+    total: Optional[int] = None  # capped at PAGINATION_COUNT_CAP, None when with_total=false
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -80,7 +81,8 @@ class ChannelLogOutSchema(BaseModel):
 
 class ChannelLogListSchema(BaseModel):
     logs: List[ChannelLogOutSchema]
-    total: int
+    total: Optional[int] = None  # capped at PAGINATION_COUNT_CAP, None when with_total=false
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -15,12 +15,38 @@ POSTGRES_USER = os.getenv("POSTGRES_USER")
 POSTGRES_DB = os.getenv("POSTGRES_DB")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # connections kept per process
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))  # extra connections under load, keep POST_DISPATCH_CONCURRENCY below the sum
 
 SUPERUSER_EMAIL = os.getenv("SUPERUSER_EMAIL", "superuser@localhost.com")
 SUPERUSER_PASSWORD = os.getenv("SUPERUSER_PASSWORD", "superuser")
 
 
 ELASTICSEARCH_HOST = os.getenv("ELASTICSEARCH_HOST")
+ES_BULK_CHUNK_SIZE = int(os.getenv("ES_BULK_CHUNK_SIZE", 500))  # documents per bulk request
+ES_BULK_MAX_BYTES = int(os.getenv("ES_BULK_MAX_BYTES", 10 * 1024 * 1024))  # bytes per bulk request
+ES_BULK_MAX_RETRIES = int(os.getenv("ES_BULK_MAX_RETRIES", 3))  # retries of items rejected with 429
+ES_KNN_NUM_CANDIDATES = int(os.getenv("ES_KNN_NUM_CANDIDATES", 50))  # candidates per shard for the retriever kNN search
+
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 16))  # chunks per embedding request
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 8000))  # tokens per embedding request
+EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", 4))  # concurrent embedding requests
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))  # retries on 429 and 5xx
+EMBEDDING_RETRY_BASE_DELAY = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY", 0.5))  # seconds, doubled per retry
+EMBEDDING_RETRY_MAX_DELAY = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY", 20))  # seconds
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000))  # cached chunk vectors, LRU evicted
+EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", 30 * 24 * 3600))  # seconds
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 50000))  # cached topic vectors, LRU evicted
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", 7 * 24 * 3600))  # seconds
+QUERY_EMBEDDING_LOCAL_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_LOCAL_CACHE_SIZE", 1000))  # topic vectors in process memory
+
+LLM_CACHE_ENABLED = bool(int(os.getenv("LLM_CACHE_ENABLED", "1")))  # reuse responses for the same prompt, documents and model
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 50000))  # cached responses, LRU evicted
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))  # seconds
+LLM_SEMANTIC_CACHE = bool(int(os.getenv("LLM_SEMANTIC_CACHE", "0")))  # also reuse the response of a similar topic
+LLM_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_SEMANTIC_CACHE_THRESHOLD", 0.95))  # cosine similarity of the topics
+LLM_SEMANTIC_CACHE_MAX_TOPICS = int(os.getenv("LLM_SEMANTIC_CACHE_MAX_TOPICS", 200))  # topics compared per channel and prompt
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 4))  # batches buffered between ingestion stages
 
 EMBEDDING_SERVICE = os.getenv("EMBEDDING_SERVICE", "huggingface")
 
@@ -40,6 +66,35 @@ UPLOAD_FOLDER = "app/uploads"
 REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
 CELERY_BROKER_URL = f"redis://:{REDIS_PASSWORD}@redis:6379/0"
 CELERY_RESULT_BACKEND = f"redis://:{REDIS_PASSWORD}@redis:6379/0"
+REDIS_URL = os.getenv("REDIS_URL", f"redis://:{REDIS_PASSWORD}@redis:6379/1")  # caches, rate limits
+
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", 300))  # seconds an auth session snapshot stays in Redis
+AUTH_LOCAL_CACHE_TTL = float(os.getenv("AUTH_LOCAL_CACHE_TTL", 10))  # seconds in process memory, bounds staleness across workers
+AUTH_LOCAL_CACHE_SIZE = int(os.getenv("AUTH_LOCAL_CACHE_SIZE", 10000))
+
+CHANNEL_LOGS_RETENTION_DAYS = int(os.getenv("CHANNEL_LOGS_RETENTION_DAYS", 30))  # whole daily partitions are dropped after this
+CHANNEL_LOGS_PARTITIONS_AHEAD = int(os.getenv("CHANNEL_LOGS_PARTITIONS_AHEAD", 14))  # daily partitions created in advance, logs fail to insert past them
+
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 30))  # seconds, per company
+
+PAGINATION_COUNT_CAP = int(os.getenv("PAGINATION_COUNT_CAP", 10000))  # list totals stop counting here
+
+SQL_METRICS_ENABLED = bool(int(os.getenv("SQL_METRICS_ENABLED", "1")))  # Server-Timing header and N+1 warnings per request
+SQL_METRICS_LOG = bool(int(os.getenv("SQL_METRICS_LOG", "0")))  # also log statement count and time of every request
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 10))  # same statement more often per request is logged
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))  # seconds
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))  # read/write timeout, seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", 10))  # wait for a free connection
+HTTP2_ENABLED = bool(int(os.getenv("HTTP2_ENABLED", "0")))
+HTTP_POOL_STATS_INTERVAL = int(os.getenv("HTTP_POOL_STATS_INTERVAL", 300))  # seconds between pool stats logs per process, 0 to turn off
+
+TELEGRAM_BOT_RATE_PER_SECOND = float(os.getenv("TELEGRAM_BOT_RATE_PER_SECOND", 30))  # per bot token
+TELEGRAM_CHAT_RATE_PER_MINUTE = float(os.getenv("TELEGRAM_CHAT_RATE_PER_MINUTE", 20))  # per chat/channel
+TELEGRAM_MAX_WAIT = float(os.getenv("TELEGRAM_MAX_WAIT", 5))  # seconds to wait for a slot before deferring the post
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
@@ -52,9 +107,23 @@ SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 SENDGRID_SENDER_EMAIL = os.getenv("SENDGRID_SENDER_EMAIL")
 
 
+SCHEDULED_AI_POST_BATCH_SIZE = int(os.getenv("SCHEDULED_AI_POST_BATCH_SIZE", 500))  # schedulers claimed per query
+SCHEDULED_AI_BATCH_MODE = bool(int(os.getenv("SCHEDULED_AI_BATCH_MODE", "1")))  # generate due schedulers in batch tasks
+SCHEDULED_AI_GENERATION_BATCH_SIZE = int(os.getenv("SCHEDULED_AI_GENERATION_BATCH_SIZE", 50))  # schedulers per batch task
+SCHEDULED_AI_LLM_CONCURRENCY = int(os.getenv("SCHEDULED_AI_LLM_CONCURRENCY", 16))  # model calls in flight per batch task
+POST_DISPATCH_BATCH_SIZE = int(os.getenv("POST_DISPATCH_BATCH_SIZE", 100))  # posts claimed per round
+POST_DISPATCH_CONCURRENCY = int(os.getenv("POST_DISPATCH_CONCURRENCY", 20))  # posts delivered in parallel
+POST_DISPATCH_FANOUT = int(os.getenv("POST_DISPATCH_FANOUT", 3))  # extra dispatchers enqueued on a large backlog
+POST_DISPATCH_MAX_SECONDS = int(os.getenv("POST_DISPATCH_MAX_SECONDS", 50))  # stop claiming before the next beat tick
+POST_DISPATCH_LEASE_MINUTES = int(os.getenv("POST_DISPATCH_LEASE_MINUTES", 10))  # reclaim posts stuck in "sending"
+
+
+RATE_LIMIT_WINDOW_SECONDS = int(os.getenv("RATE_LIMIT_WINDOW_SECONDS", 60))  # sliding window of RATE_LIMITS_PER_MINUTE
 RATE_LIMITS_PER_MINUTE = {
     "ai_generate": 1,
     "post_send": 1
 }
+USAGE_AUDIT_LOG = bool(int(os.getenv("USAGE_AUDIT_LOG", "1")))  # also write a usages row per consumed action
+USAGE_ROLLUP_BATCH_SIZE = int(os.getenv("USAGE_ROLLUP_BATCH_SIZE", 10000))  # raw usages moved to usage_daily per transaction
 
 
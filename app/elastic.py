@@ -0,0 +1,29 @@
+import asyncio
+
+from elasticsearch import AsyncElasticsearch
+
+from app import config
+
+# The client's aiohttp session is bound to the event loop it was first used on.
+_client: AsyncElasticsearch = None
+_loop: asyncio.AbstractEventLoop = None
+
+
+def get_es() -> AsyncElasticsearch:
+    """
+    Return the process-wide async Elasticsearch client.
+    """
+    global _client, _loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _loop is not loop:
+        _client = AsyncElasticsearch(config.ELASTICSEARCH_HOST)
+        _loop = loop
+    return _client
+
+
+async def close_es():
+    global _client, _loop
+    if _client is not None and _loop is asyncio.get_running_loop():
+        await _client.close()
+    _client = None
+    _loop = None
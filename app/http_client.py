@@ -0,0 +1,142 @@
+import asyncio
+import time
+from typing import Dict
+
+import httpcore
+import httpx
+
+from app import config
+
+
+class StatsConnectionPool(httpcore.AsyncConnectionPool):
+    """
+    Connection pool that counts the requests it had to queue, because no connection
+    could take them: none idle for HTTP/1.1, none with a free stream for HTTP/2, and
+    no room for a new one. Reads the pool's own request queue, an httpcore internal.
+    """
+    waits = 0
+
+    def _assign_requests_to_connections(self):
+        closing = super()._assign_requests_to_connections()
+        for pool_request in self._requests:
+            if pool_request.is_queued() and not getattr(pool_request, "waited", False):
+                pool_request.waited = True
+                self.waits += 1
+        return closing
+
+    def queued(self) -> int:
+        return sum(1 for pool_request in self._requests if pool_request.is_queued())
+
+
+class PoolStatsTransport(httpx.AsyncHTTPTransport):
+    """
+    AsyncHTTPTransport that keeps counters used to size the connection pool.
+    """
+
+    def __init__(self, limits: httpx.Limits, **kwargs):
+        super().__init__(limits=limits, **kwargs)
+        # same pool, with the wait counter
+        self._pool.__class__ = StatsConnectionPool
+        self.max_connections = limits.max_connections
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        connections = list(self._pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections": len(connections),
+            "in_use": len(connections) - idle,
+            "idle": idle,
+            "max_connections": self.max_connections,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "queued": self._pool.queued(),
+            "waits": self._pool.waits,  # requests that waited for a connection
+        }
+
+
+# Clients are bound to the event loop they were created on, so one client per name per process.
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, PoolStatsTransport] = {}
+_loops: Dict[str, asyncio.AbstractEventLoop] = {}
+
+
+def _create_client(name: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(
+        config.HTTP_TIMEOUT,
+        connect=config.HTTP_CONNECT_TIMEOUT,
+        pool=config.HTTP_POOL_TIMEOUT,
+    )
+    transport = PoolStatsTransport(limits=limits, http2=config.HTTP2_ENABLED)
+    _transports[name] = transport
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+
+def get_client(name: str = "default") -> httpx.AsyncClient:
+    """
+    Return the shared keep-alive client registered under `name`.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(name)
+    if client is None or client.is_closed or _loops.get(name) is not loop:
+        client = _create_client(name)
+        _clients[name] = client
+        _loops[name] = loop
+    return client
+
+
+def pool_stats() -> Dict[str, dict]:
+    return {name: transport.stats() for name, transport in _transports.items()}
+
+
+_stats_logged_at = time.monotonic()
+
+
+def log_pool_stats(log=print, force: bool = False):
+    """
+    Log the pool stats of this process, at most every HTTP_POOL_STATS_INTERVAL seconds.
+    """
+    global _stats_logged_at
+    now = time.monotonic()
+    if not config.HTTP_POOL_STATS_INTERVAL or not _transports:
+        return
+    if not force and now - _stats_logged_at < config.HTTP_POOL_STATS_INTERVAL:
+        return
+    _stats_logged_at = now
+    log(f"HTTP pool stats: {pool_stats()}")
+
+
+async def report_pool_stats():
+    """
+    Log the pool stats every HTTP_POOL_STATS_INTERVAL seconds, for processes whose
+    event loop runs all the time.
+    """
+    while config.HTTP_POOL_STATS_INTERVAL:
+        await asyncio.sleep(config.HTTP_POOL_STATS_INTERVAL)
+        log_pool_stats(force=True)
+
+
+async def close_clients():
+    for name, client in list(_clients.items()):
+        if not client.is_closed and _loops.get(name) is asyncio.get_running_loop():
+            await client.aclose()
+    _clients.clear()
+    _transports.clear()
+    _loops.clear()
@@ -1,3 +1,4 @@
+import asyncio
 import json
 
 from fastapi import FastAPI
@@ -15,6 +16,10 @@ from app.manager import init_superuser
 from app.ai.router import router as ai_router
 from app.billing.webhooks import router as webhooks_router
 from app.billing.router import router as billing_router
+from app.cache import close_redis
+from app.elastic import close_es
+from app.http_client import close_clients, report_pool_stats
+from app.sql_metrics import SQLMetricsMiddleware
 
 
 async def create_elasticsearch_indices():
@@ -64,12 +69,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if config.SQL_METRICS_ENABLED:
+    app.add_middleware(SQLMetricsMiddleware)
 
 
 @app.on_event("startup")
 async def startup_event():
     await init_superuser()
     await create_elasticsearch_indices()
+    app.state.pool_stats_reporter = asyncio.create_task(report_pool_stats())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.pool_stats_reporter.cancel()
+    await close_clients()
+    await close_redis()
+    await close_es()
 
 
 # @app.get("/")
@@ -0,0 +1,65 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from app import config
+
+Cursor = Tuple[datetime, int]
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    data = json.dumps([created_at.isoformat(), id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Cursor]:
+    """
+    Position encoded by encode_cursor, raises 400 for a token that isn't one.
+    """
+    if not cursor:
+        return None
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(data)
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(stmt: Select, model, page: int, limit: int, after: Optional[Cursor] = None) -> Select:
+    """
+    Newest first by (created_at, id). Rows after the cursor position when given,
+    otherwise the page by offset. One row more than `limit` is selected to know if
+    there is a next page, see `page_items`.
+    """
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    if after:
+        return stmt.where(tuple_(model.created_at, model.id) < tuple_(*after))
+    return stmt.offset((max(page, 1) - 1) * limit)
+
+
+def page_items(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """
+    Rows of the page and the cursor of the next one.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+async def capped_count(stmt: Select, session: AsyncSession, cap: int = None) -> int:
+    """
+    Rows of `stmt`, counted up to `cap` (PAGINATION_COUNT_CAP), so large lists stop
+    counting early instead of scanning everything.
+    """
+    cap = cap or config.PAGINATION_COUNT_CAP
+    subquery = stmt.limit(cap).subquery()
+    result = await session.execute(select(func.count()).select_from(subquery))
+    return result.scalar_one()
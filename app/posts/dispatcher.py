@@ -0,0 +1,114 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from celery.utils.log import get_task_logger
+
+from app import config
+from app.billing.services.usage import check_and_consume_usage
+from app.channels.queries import create_channel_log_query
+from app.database import async_session_maker
+from app.http_client import pool_stats
+from app.posts import queries as post_queries
+from app.posts.models import Post
+from app.providers import telegram
+
+logger = get_task_logger(__name__)
+
+
+def get_provider(post: Post):
+    if post.channel.channel_type == "telegram":
+        return telegram.Telegram(post)
+    return None
+
+
+async def mark_post_failed(post: Post, message: str):
+    async with async_session_maker() as session:
+        await create_channel_log_query(
+            data={
+                "channel_id": post.channel_id,
+                "post_id": post.id,
+                "message": message,
+            },
+            session=session,
+        )
+        await post_queries.update_post_query(
+            session=session,
+            post_id=post.id,
+            data={"status": "failed"},
+        )
+
+
+async def deliver_post(post: Post):
+    """
+    Take a provider send slot, consume usage for a claimed post once and send it.
+    """
+    provider = get_provider(post)
+    if not provider:
+        await mark_post_failed(post, f"Post not sent. Unsupported channel type {post.channel.channel_type}.")
+        return
+
+    delay = await provider.reserve()
+    if delay:
+        async with async_session_maker() as session:
+            await provider.defer(delay, "Provider rate limit reached.", session)
+        return
+
+    # a post deferred or reclaimed from a stale lease was already charged
+    if not post.usage_charged:
+        async with async_session_maker() as session:
+            success, message = await check_and_consume_usage(
+                db=session,
+                company=post.channel.company,
+                action="post",
+                raise_exception=False,
+                before_commit=lambda db: post_queries.mark_post_usage_charged_query(post.id, db),
+            )
+        if not success:
+            await mark_post_failed(post, f"Post not sent. {message}")
+            return
+    await provider.send()
+
+
+async def dispatch_due_posts(on_full_batch: Optional[Callable[[], None]] = None) -> int:
+    """
+    Claim due posts in batches and deliver them concurrently.
+
+    Returns the number of posts handled. `on_full_batch` is called once when the
+    first claimed batch is full, so the caller can bring in more dispatchers.
+    """
+    semaphore = asyncio.Semaphore(config.POST_DISPATCH_CONCURRENCY)
+    deadline = time.monotonic() + config.POST_DISPATCH_MAX_SECONDS
+    handled = 0
+
+    async def deliver(post: Post):
+        async with semaphore:
+            try:
+                await deliver_post(post)
+            except Exception as e:
+                logger.exception(f"Error while sending post {post.id}: {e}")
+                await mark_post_failed(post, "Post not sent. Unexpected error while sending.")
+
+    while time.monotonic() < deadline:
+        now = datetime.now(tz=timezone.utc).replace(tzinfo=None)
+        async with async_session_maker() as session:
+            posts = await post_queries.claim_due_posts_query(
+                end_date=now,
+                limit=config.POST_DISPATCH_BATCH_SIZE,
+                stale_before=now - timedelta(minutes=config.POST_DISPATCH_LEASE_MINUTES),
+                session=session,
+                options=post_queries.POST_FOR_DELIVERY,
+            )
+        if not posts:
+            break
+        if handled == 0 and on_full_batch and len(posts) >= config.POST_DISPATCH_BATCH_SIZE:
+            on_full_batch()
+
+        await asyncio.gather(*(deliver(post) for post in posts))
+        handled += len(posts)
+        if len(posts) < config.POST_DISPATCH_BATCH_SIZE:
+            break
+
+    logger.info(f"Dispatched {handled} posts. HTTP pool stats: {pool_stats()}")
+    return handled
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import ForeignKey, DateTime, JSON
+from sqlalchemy import ForeignKey, DateTime, JSON, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -8,6 +8,12 @@ from app.database import Base
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_due", "scheduled_time", postgresql_where=text("status = 'scheduled'")),
+        Index("ix_posts_sending", "claimed_at", postgresql_where=text("status = 'sending'")),
+        Index("ix_posts_channel_id_created_at_id", "channel_id", "created_at", "id"),
+        Index("ix_posts_company_id_created_at", "company_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     company_id: Mapped[int] = mapped_column(ForeignKey("companies.id", ondelete="CASCADE"))
@@ -16,8 +22,10 @@ class Post(Base):
     ai_generated: Mapped[bool] = mapped_column(default=False)  # Whether the post was AI-generated
     scheduled_time: Mapped[datetime] = mapped_column(DateTime(), nullable=True)  # Time when the post is scheduled to be sent
     created_at: Mapped[datetime] = mapped_column(DateTime(), server_default=func.now())  # Time when the post was created
-    status: Mapped[str] = mapped_column(nullable=False, default="draft")  # Status of the post (e.g., draft, scheduled, published, failed)
+    status: Mapped[str] = mapped_column(nullable=False, default="draft")  # Status of the post (e.g., draft, scheduled, sending, published, failed)
     timezone: Mapped[str] = mapped_column(nullable=True, server_default="UTC")  # Timezone of the scheduled time
+    claimed_at: Mapped[datetime] = mapped_column(DateTime(), nullable=True)  # Time when a dispatcher claimed the post for sending
+    usage_charged: Mapped[bool] = mapped_column(nullable=False, server_default="false")  # post usage already consumed, not charged again on retries
 
-    channel: Mapped["Channel"] = relationship(back_populates="posts", lazy="selectin")
-    logs: Mapped["ChannelLog"] = relationship(back_populates="post", lazy="selectin")  # Relationship to channel logs
+    channel: Mapped["Channel"] = relationship(back_populates="posts", lazy="raise")
+    logs: Mapped["ChannelLog"] = relationship(back_populates="post", lazy="raise", passive_deletes=True)  # Relationship to channel logs
@@ -1,12 +1,20 @@
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 from sqlalchemy.ext.asyncio.session import AsyncSession
+from sqlalchemy.orm import joinedload
 from app.auth.models import AuthSession
 from sqlalchemy import select, insert, delete, update, func
+from app.channels.models import Channel
 from app.posts.models import Post
+from app.users.models import Company
+from app.pagination import Cursor, capped_count, page_items, paginate
 import traceback
 
+# loader profiles, relationships load nothing unless a query asks for it
+POST_WITH_CHANNEL = (joinedload(Post.channel),)
+POST_FOR_DELIVERY = (joinedload(Post.channel).joinedload(Channel.company).joinedload(Company.current_plan),)
+
 
 async def create_post_query(data: dict, session: AsyncSession) -> Post:
     try:
@@ -19,6 +27,24 @@ async def create_post_query(data: dict, session: AsyncSession) -> Post:
         traceback.print_exc()
 
 
+async def create_posts_query(data: List[dict], session: AsyncSession) -> int:
+    try:
+        if not data:
+            return 0
+        await session.execute(insert(Post), data)
+        await session.commit()
+        return len(data)
+    except Exception as e:
+        await session.rollback()
+        traceback.print_exc()
+        return 0
+
+
+async def mark_post_usage_charged_query(post_id: int, session: AsyncSession):
+    # no commit, runs in the usage transaction of check_and_consume_usage
+    await session.execute(update(Post).where(Post.id == post_id).values(usage_charged=True))
+
+
 async def update_post_query(post_id: int, data: dict, session: AsyncSession) -> Post:
     try:
         stmt = (
@@ -46,12 +72,13 @@ async def delete_post_query(post_id: int, session: AsyncSession):
         traceback.print_exc()
 
 
-async def get_post_query(post_id: int, company_id: int, session: AsyncSession) -> Post:
+async def get_post_query(post_id: int, company_id: int, session: AsyncSession, options: tuple = ()) -> Post:
     try:
         stmt = (
             select(Post)
             .where(Post.id == post_id)
             .where(Post.company_id == company_id)
+            .options(*options)
         )
         result = await session.execute(stmt)
         return result.scalars().first()
@@ -60,43 +87,83 @@ async def get_post_query(post_id: int, company_id: int, session: AsyncSession) -
         return None
 
 
-async def get_posts_query(company_id: int, channel_id: int, page: int, limit: int, session: AsyncSession) -> tuple[List[Post], int]:
+async def get_posts_query(
+    company_id: int,
+    channel_id: int,
+    page: int,
+    limit: int,
+    session: AsyncSession,
+    after: Optional[Cursor] = None,
+    with_total: bool = True,
+) -> tuple[List[Post], Optional[int], Optional[str]]:
     try:
-        page = max(page, 1)
-        stmt = (
+        stmt = paginate(
             select(Post)
             .where(Post.company_id == company_id)
-            .where(Post.channel_id == channel_id)
-            .offset((page - 1) * limit)
-            .limit(limit).order_by(Post.created_at.desc())
+            .where(Post.channel_id == channel_id),
+            Post, page, limit, after,
         )
         result = await session.execute(stmt)
-        posts = result.scalars().all()
-
-        count_stmt = (
-            select(func.count(Post.id))
-            .where(Post.company_id == company_id)
-            .where(Post.channel_id == channel_id)
-        )
-        count_result = await session.execute(count_stmt)
-        total_count = count_result.scalar_one()
-
-        return posts, total_count
+        posts, next_cursor = page_items(result.scalars().all(), limit)
+
+        total_count = None
+        if with_total:
+            count_stmt = (
+                select(Post.id)
+                .where(Post.company_id == company_id)
+                .where(Post.channel_id == channel_id)
+            )
+            total_count = await capped_count(count_stmt, session)
+
+        return posts, total_count, next_cursor
     except Exception as e:
         traceback.print_exc()
-        return [], 0
-
-
-async def celery_get_posts_for_loop_query(end_date: datetime, session: AsyncSession) -> List[Post]:
+        return [], 0, None
+
+
+async def claim_due_posts_query(
+    end_date: datetime,
+    limit: int,
+    session: AsyncSession,
+    stale_before: datetime = None,
+    options: tuple = (),
+) -> List[Post]:
+    """
+    Claim up to `limit` due posts for sending.
+
+    Rows are locked with FOR UPDATE SKIP LOCKED and moved to the "sending" status
+    in the same transaction, so concurrent dispatchers never claim the same post.
+    Posts stuck in "sending" since before `stale_before` are claimed again.
+    """
     try:
-        stmt = (
-            select(Post)
-            .where(Post.scheduled_time <= end_date)
-            .where(Post.status == "scheduled")
+        due = (Post.status == "scheduled") & (Post.scheduled_time <= end_date)
+        if stale_before:
+            due = due | ((Post.status == "sending") & (Post.claimed_at < stale_before))
+        claim_stmt = (
+            select(Post.id)
+            .where(due)
+            .order_by(Post.scheduled_time)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
         )
-        result = await session.execute(stmt)
+        result = await session.execute(claim_stmt)
+        post_ids = result.scalars().all()
+        if not post_ids:
+            await session.commit()
+            return []
+
+        await session.execute(
+            update(Post)
+            .where(Post.id.in_(post_ids))
+            .values(status="sending", claimed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+        result = await session.execute(select(Post).where(Post.id.in_(post_ids)).options(*options))
         return result.scalars().all()
     except Exception as e:
+        await session.rollback()
         traceback.print_exc()
         return []
 
@@ -1,15 +1,19 @@
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth import auth as auth_tools
+from app.auth.cache import UserSnapshot
 from app.billing.models import ActionType
-from app.billing.services.rate_limit import check_rate_limit
+from app.billing.services.rate_limit import check_rate_limit, release_rate_limit
 from app.billing.services.usage import check_and_consume_usage
 from app.posts import queries as post_queries
 from app.posts import schemas as post_schemas
 from app.schemas import SuccessResponseSchema
-from app.users import models as user_models
 from app.database import get_session
+from app.pagination import decode_cursor
 from app.providers import telegram
+from app.providers.provider import ProviderRateLimited
 import pytz
 
 
@@ -20,7 +24,7 @@ router = APIRouter()
 async def create_post(
     post: post_schemas.PostInSchema,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Create a new post.
@@ -45,7 +49,7 @@ async def update_post(
     post_id: int,
     post: post_schemas.PostUpdateSchema,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Update an existing post.
@@ -74,7 +78,7 @@ async def update_post(
 async def delete_post(
     post_id: int,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Delete a post.
@@ -93,7 +97,7 @@ async def delete_post(
 async def get_post(
     post_id: int,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Get a post by ID.
@@ -109,32 +113,39 @@ async def list_posts(
     channel_id: int,
     page: int = 1,
     limit: int = 10,
+    cursor: Optional[str] = None,
+    with_total: bool = True,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
-    List posts for a specific channel.
+    List posts for a specific channel. Pass `next_cursor` of a response as `cursor`
+    for the next page; `page` keeps working.
     """
-    posts, total = await post_queries.get_posts_query(user.company_id, channel_id, page, limit, session)
-    return {"posts": posts, "total": total}
+    posts, total, next_cursor = await post_queries.get_posts_query(
+        user.company_id, channel_id, page, limit, session,
+        after=decode_cursor(cursor), with_total=with_total,
+    )
+    return {"posts": posts, "total": total, "next_cursor": next_cursor}
 
 
 @router.post("/{post_id}/send", response_model=SuccessResponseSchema)
 async def send_post(
     post_id: int,
     session: AsyncSession = Depends(get_session),
-    user: user_models.User = Depends(auth_tools.get_current_active_user),
+    user: UserSnapshot = Depends(auth_tools.get_current_active_user),
 ):
     """
     Send a post to the channel.
     """
-    existing_post = await post_queries.get_post_query(post_id, user.company_id, session)
+    existing_post = await post_queries.get_post_query(
+        post_id, user.company_id, session, options=post_queries.POST_WITH_CHANNEL,
+    )
     if not existing_post:
         raise HTTPException(status_code=404, detail="Post not found")
 
     # rate limit check
-    await check_rate_limit(
-        db=session,
+    rate_limit = await check_rate_limit(
         channel=existing_post.channel,
         action="post_send"
     )
@@ -146,13 +157,38 @@ async def send_post(
     if not provider:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    await check_and_consume_usage(
-        db=session,
-        company=user.company,
-        action=ActionType.POST,
-    )
-
-    result = await provider.send()
+    # a send refused below doesn't count against the rate limit
+    delay = await provider.reserve()
+    if delay:
+        await release_rate_limit(rate_limit)
+        raise HTTPException(
+            status_code=429,
+            detail="Provider rate limit reached. Try again later.",
+            headers={"Retry-After": str(int(delay) + 1)},
+        )
+
+    # a post whose send was rate limited or failed was already charged
+    if not existing_post.usage_charged:
+        try:
+            await check_and_consume_usage(
+                db=session,
+                company=user.company,
+                action=ActionType.POST,
+                before_commit=lambda db: post_queries.mark_post_usage_charged_query(existing_post.id, db),
+            )
+        except HTTPException:
+            await release_rate_limit(rate_limit)
+            raise
+
+    try:
+        result = await provider.send(defer=False)
+    except ProviderRateLimited as e:
+        await release_rate_limit(rate_limit)
+        raise HTTPException(
+            status_code=429,
+            detail="Provider rate limit reached. Try again later.",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
     if not result:
         raise HTTPException(status_code=400, detail="Failed to send post")
 
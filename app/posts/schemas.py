@@ -8,6 +8,7 @@ from datetime import datetime
 class PostStatus(str, Enum):
     DRAFT = "draft"
     SCHEDULED = "scheduled"
+    SENDING = "sending"
     PUBLISHED = "published"
     FAILED = "failed"
 
@@ -75,7 +76,8 @@ class PostUpdateSchema(BaseModel):
 
 class PostListSchema(BaseModel):
     posts: List[PostOutSchema]
-    total: int
+    total: Optional[int] = None  # capped at PAGINATION_COUNT_CAP, None when with_total=false
+    next_cursor: Optional[str] = None
 
     class Config:
         orm_mode = True
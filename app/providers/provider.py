@@ -1,13 +1,60 @@
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app.channels import queries as channel_queries
+from app.http_client import get_client
+from app.posts import queries as posts_queries
 from app.posts.models import Post
 
 
+class ProviderRateLimited(Exception):
+    """
+    The provider refused the send for `retry_after` seconds and the post was left as is.
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Provider rate limit reached, retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+
 class Provider:
+    # name of the shared client in app.http_client registry
+    client_name = "default"
 
     def __init__(self, post: Post):
         self.post = post
 
-    async def send(self):
+    @property
+    def http(self) -> httpx.AsyncClient:
+        return get_client(self.client_name)
+
+    async def reserve(self) -> float:
+        """
+        Take a send slot from the provider rate limits.
+        Returns 0 when the post can be sent now, otherwise seconds to defer it by.
+        """
+        return 0
+
+    async def defer(self, delay: float, reason: str, session):
+        """
+        Put the post back to the schedule instead of failing it.
+        """
+        scheduled_time = datetime.now(tz=timezone.utc).replace(tzinfo=None) + timedelta(seconds=delay)
+        await channel_queries.create_channel_log_query({
+            "channel_id": self.post.channel_id,
+            "post_id": self.post.id,
+            "message": f"Post delayed by {int(delay) + 1}s. {reason}"
+        }, session)
+        await posts_queries.update_post_query(self.post.id, {
+            "status": "scheduled",
+            "scheduled_time": scheduled_time,
+        }, session)
+
+    async def send(self, defer: bool = True):
         """
         Send the post to the provider.
+        With `defer` a rate limited post goes back to the schedule, otherwise
+        ProviderRateLimited is raised and the post is left as is.
         """
-        raise NotImplementedError("Subclasses must implement send method")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement send method")
@@ -0,0 +1,124 @@
+import asyncio
+import math
+
+from app import config
+from app.cache import get_redis
+
+# Two token buckets (bot token and chat) are checked and taken together, so a
+# send only consumes budget when both allow it. Block keys hold `retry_after`
+# windows reported by Telegram. Returns 0 when a slot was taken, otherwise the
+# number of milliseconds to wait.
+#
+# KEYS: bot bucket, chat bucket, bot block, chat block
+# ARGV: bot rate (per second), bot burst, chat rate (per second), chat burst
+TOKEN_BUCKET_SCRIPT = """
+local blocked = math.max(redis.call('PTTL', KEYS[3]), redis.call('PTTL', KEYS[4]))
+if blocked > 0 then
+    return blocked
+end
+
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+
+local function refill(key, rate, burst)
+    local data = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or burst
+    local ts = tonumber(data[2]) or now
+    return math.min(burst, tokens + math.max(0, now - ts) * rate / 1000)
+end
+
+local function wait_for(tokens, rate)
+    if tokens >= 1 then
+        return 0
+    end
+    return math.ceil((1 - tokens) * 1000 / rate)
+end
+
+local bot_rate, bot_burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local chat_rate, chat_burst = tonumber(ARGV[3]), tonumber(ARGV[4])
+local bot_tokens = refill(KEYS[1], bot_rate, bot_burst)
+local chat_tokens = refill(KEYS[2], chat_rate, chat_burst)
+
+local wait = math.max(wait_for(bot_tokens, bot_rate), wait_for(chat_tokens, chat_rate))
+if wait == 0 then
+    bot_tokens = bot_tokens - 1
+    chat_tokens = chat_tokens - 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', bot_tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(bot_burst / bot_rate * 1000) + 1000)
+redis.call('HSET', KEYS[2], 'tokens', chat_tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[2], math.ceil(chat_burst / chat_rate * 1000) + 1000)
+return wait
+"""
+
+
+def _bot_id(bot_token: str) -> str:
+    # the part before ":" is the public bot id, keep the secret out of Redis keys
+    return str(bot_token or "").split(":")[0]
+
+
+class TelegramRateGovernor:
+    """
+    Shared send budget per bot token and per chat, kept in Redis so every
+    worker draws from the same buckets.
+    """
+
+    def __init__(self):
+        self.bot_rate = config.TELEGRAM_BOT_RATE_PER_SECOND
+        self.chat_rate = config.TELEGRAM_CHAT_RATE_PER_MINUTE / 60
+
+    def _keys(self, bot_token: str, chat_id) -> list:
+        bot_id = _bot_id(bot_token)
+        return [
+            f"tg:bucket:{bot_id}",
+            f"tg:bucket:{bot_id}:{chat_id}",
+            f"tg:block:{bot_id}",
+            f"tg:block:{bot_id}:{chat_id}",
+        ]
+
+    async def try_acquire(self, bot_token: str, chat_id) -> float:
+        """
+        Take one send slot if available. Returns 0 on success, otherwise seconds to wait.
+        """
+        wait_ms = await get_redis().eval(
+            TOKEN_BUCKET_SCRIPT,
+            4,
+            *self._keys(bot_token, chat_id),
+            self.bot_rate,
+            config.TELEGRAM_BOT_RATE_PER_SECOND,
+            self.chat_rate,
+            config.TELEGRAM_CHAT_RATE_PER_MINUTE,
+        )
+        return int(wait_ms) / 1000
+
+    async def acquire(self, bot_token: str, chat_id, max_wait: float = None) -> float:
+        """
+        Wait for a send slot for up to `max_wait` seconds.
+        Returns 0 when a slot was taken, otherwise the delay the send should be deferred by.
+        """
+        if max_wait is None:
+            max_wait = config.TELEGRAM_MAX_WAIT
+        waited = 0.0
+        while True:
+            wait = await self.try_acquire(bot_token, chat_id)
+            if wait <= 0:
+                return 0
+            if waited + wait > max_wait:
+                return wait
+            await asyncio.sleep(wait)
+            waited += wait
+
+    async def block(self, bot_token: str, chat_id, retry_after: float, whole_bot: bool = False):
+        """
+        Stop sends for `retry_after` seconds, as requested by a 429 response.
+        """
+        bot_key, chat_key = self._keys(bot_token, chat_id)[2:]
+        await get_redis().set(
+            bot_key if whole_bot else chat_key,
+            1,
+            px=max(1, math.ceil(retry_after * 1000)),
+        )
+
+
+governor = TelegramRateGovernor()
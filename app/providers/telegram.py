@@ -1,68 +1,108 @@
+import asyncio
 import traceback
 
 import httpx
+from app import config
 from app.database import async_session_maker
 from app.channels import queries as channel_queries
 from app.posts import queries as posts_queries
-from app.providers.provider import Provider
+from app.providers.provider import Provider, ProviderRateLimited
+from app.providers.rate_limit import governor
 
 
 class Telegram(Provider):
+    client_name = "telegram"
 
     def __init__(self, post):
         super().__init__(post)
         self.config = post.channel.config_json
-        self.base_url = f"https://api.telegram.org/bot{self.config.get('telegram_bot_token')}"
+        self.bot_token = self.config.get("telegram_bot_token")
+        self.chat_id = self.config.get("telegram_channel_id")
+        self.base_url = f"https://api.telegram.org/bot{self.bot_token}"
 
-    async def send(self):
+    async def reserve(self) -> float:
+        return await governor.acquire(self.bot_token, self.chat_id)
+
+    @staticmethod
+    def retry_after(response: httpx.Response) -> float:
+        try:
+            return float(response.json().get("parameters", {}).get("retry_after", 1))
+        except ValueError:
+            return 1.0
+
+    async def wait_for_retry(self, response: httpx.Response) -> bool:
+        """
+        Honour a short `retry_after` in place. Returns True when the send can be retried now.
+        """
+        retry_after = self.retry_after(response)
+        await governor.block(self.bot_token, self.chat_id, retry_after)
+        if retry_after > config.TELEGRAM_MAX_WAIT:
+            return False
+        await asyncio.sleep(retry_after)
+        return not await self.reserve()
+
+    async def send(self, defer: bool = True):
         """
         Send the post to the provider.
+        A slot must be taken with `reserve` before calling this method.
+        With `defer` a rate limited post goes back to the schedule, otherwise
+        ProviderRateLimited is raised and the post is left as is.
         """
         async with async_session_maker() as session:
             url = f"{self.base_url}/sendMessage"
             payload = {
-                "chat_id": self.config.get("telegram_channel_id"),
+                "chat_id": self.chat_id,
                 "text": self.post.content,
                 "parse_mode": self.config.get("parse_mode", "html"),
             }
-            async with httpx.AsyncClient() as client:
-                try:
-                    response = await client.post(url, json=payload)
-                    response.raise_for_status()
-                    data = response.json()
-                    if data.get("ok"):
-                        # Log the successful message
-                        await channel_queries.create_channel_log_query({
-                            "channel_id": self.post.channel_id,
-                            "post_id": self.post.id,
-                            "action": "post_send",
-                            "message": f"Post sent to Telegram. Message ID: {data['result']['message_id']}"
-                        }, session)
-                        await posts_queries.update_post_query(self.post.id, {
-                            "status": "published"
-                        }, session)
-                        return data["result"]
-                    else:
-                        # Log the error message
-                        await channel_queries.create_channel_log_query({
-                            "channel_id": self.post.channel_id,
-                            "post_id": self.post.id,
-                            "message": f"Failed to send post to Telegram. Error: {data.get('description')}"
-                        }, session)
-                        await posts_queries.update_post_query(self.post.id, {
-                            "status": "failed"
-                        }, session)
-                        return None
-                except httpx.HTTPStatusError as e:
-                    # Log the HTTP error
-                    traceback.print_exc()
+            try:
+                response = await self.http.post(url, json=payload)
+                if response.status_code == 429 and await self.wait_for_retry(response):
+                    response = await self.http.post(url, json=payload)
+                if response.status_code == 429:
+                    # Telegram flood control, send the post later instead of failing it
+                    retry_after = self.retry_after(response)
+                    await governor.block(self.bot_token, self.chat_id, retry_after)
+                    if not defer:
+                        raise ProviderRateLimited(retry_after)
+                    await self.defer(retry_after, "Telegram rate limit reached.", session)
+                    return None
+                response.raise_for_status()
+                data = response.json()
+                if data.get("ok"):
+                    # Log the successful message
                     await channel_queries.create_channel_log_query({
                         "channel_id": self.post.channel_id,
                         "post_id": self.post.id,
-                        "message": f"HTTP error occurred: {str(e)}"
+                        "action": "post_send",
+                        "message": f"Post sent to Telegram. Message ID: {data['result']['message_id']}"
+                    }, session)
+                    # the charge is used up, sending the post again is a new send
+                    await posts_queries.update_post_query(self.post.id, {
+                        "status": "published",
+                        "usage_charged": False,
+                    }, session)
+                    return data["result"]
+                else:
+                    # Log the error message
+                    await channel_queries.create_channel_log_query({
+                        "channel_id": self.post.channel_id,
+                        "post_id": self.post.id,
+                        "message": f"Failed to send post to Telegram. Error: {data.get('description')}"
                     }, session)
                     await posts_queries.update_post_query(self.post.id, {
                         "status": "failed"
                     }, session)
                     return None
-
+            except httpx.HTTPError as e:
+                # Log the HTTP error
+                traceback.print_exc()
+                await channel_queries.create_channel_log_query({
+                    "channel_id": self.post.channel_id,
+                    "post_id": self.post.id,
+                    "message": f"HTTP error occurred: {str(e)}"
+                }, session)
+                await posts_queries.update_post_query(self.post.id, {
+                    "status": "failed"
+                }, session)
+                return None
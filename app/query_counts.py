@@ -0,0 +1,153 @@
+"""
+SQL statement and row counts for the main read endpoints.
+
+    python -m app.query_counts [--token JTI] [--eager] [--save FILE] [--compare FILE]
+
+The endpoint functions are called directly, each with a fresh session, for the user
+of the newest auth session (or of --token), and every statement sent to the database
+is counted together with the rows it returned. --eager switches every relationship
+back to the old blanket lazy="selectin" loading, so
+
+    python -m app.query_counts --eager --save before.json
+    python -m app.query_counts --compare before.json
+
+shows what the explicit loader profiles save on the same data.
+"""
+import argparse
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import configure_mappers
+
+from app.ai import router as ai_router
+from app.auth import queries as auth_queries
+from app.auth.cache import AuthSnapshot
+from app.auth.models import AuthSession
+from app.billing import router as billing_router
+from app.channels import router as channel_router
+from app.database import Base, engine, async_session_maker
+from app.posts import router as post_router
+from app.posts.models import Post
+from app.users import queries as user_queries
+
+SCENARIOS: List[Tuple[str, Callable[[AsyncSession, SimpleNamespace], Awaitable]]] = [
+    ("auth session", lambda session, ctx: auth_queries.get_auth_session(
+        ctx.token, session, options=auth_queries.AUTH_SESSION_WITH_USER)),
+    # the endpoint serves it from Redis for DASHBOARD_CACHE_TTL, count the query behind it
+    ("GET /users/dashboard", lambda session, ctx: user_queries.get_dashboard_query(
+        company_id=ctx.user.company_id, limit=10, session=session)),
+    ("GET /channels", lambda session, ctx: channel_router.list_channels(
+        page=1, limit=10, session=session, user=ctx.user)),
+    ("GET /channels/{id}", lambda session, ctx: channel_router.get_channel(
+        channel_id=ctx.channel_id, session=session, user=ctx.user)),
+    ("GET /channels/{id}/logs", lambda session, ctx: channel_router.list_channel_logs(
+        channel_id=ctx.channel_id, page=1, limit=10, session=session, user=ctx.user)),
+    ("GET /posts", lambda session, ctx: post_router.list_posts(
+        channel_id=ctx.channel_id, page=1, limit=10, session=session, user=ctx.user)),
+    ("GET /posts/{id}", lambda session, ctx: post_router.get_post(
+        post_id=ctx.post_id, session=session, user=ctx.user)),
+    ("GET /ai/sources", lambda session, ctx: ai_router.get_sources(
+        channel_id=ctx.channel_id, page=1, limit=10, user=ctx.user, session=session)),
+    ("GET /ai/scheduled-posts", lambda session, ctx: ai_router.get_scheduled_posts(
+        channel_id=ctx.channel_id, user=ctx.user, session=session)),
+    ("GET /billing/subscription", lambda session, ctx: billing_router.get_subscription(
+        session=session, user=ctx.user)),
+    ("GET /billing/payments", lambda session, ctx: billing_router.get_payments(
+        page=1, limit=10, session=session, user=ctx.user)),
+]
+
+
+def use_selectin_everywhere():
+    """
+    Load every relationship with selectin again, as the models did before loader profiles.
+    """
+    configure_mappers()
+    for mapper in Base.registry.mappers:
+        for prop in mapper.relationships:
+            prop.strategy_key = (("lazy", "selectin"),)
+            prop.strategy = prop._get_strategy(prop.strategy_key)
+
+
+async def load_context(token: str = None) -> SimpleNamespace:
+    async with async_session_maker() as session:
+        if token is None:
+            result = await session.execute(select(AuthSession.token).order_by(AuthSession.id.desc()).limit(1))
+            token = result.scalar()
+        auth_session = await auth_queries.get_auth_session(
+            token, session, options=auth_queries.AUTH_SESSION_WITH_USER,
+        )
+        if not auth_session:
+            raise SystemExit("No auth session to run the endpoints for.")
+        user = AuthSnapshot.model_validate(auth_session).user
+        result = await session.execute(
+            select(Post.id, Post.channel_id)
+            .where(Post.company_id == user.company_id)
+            .order_by(Post.id.desc())
+            .limit(1)
+        )
+        post_id, channel_id = result.first() or (0, 0)
+    return SimpleNamespace(token=token, user=user, post_id=post_id, channel_id=channel_id)
+
+
+async def count_queries(ctx: SimpleNamespace) -> Dict[str, Dict[str, int]]:
+    counts = {"statements": 0, "rows": 0}
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        counts["statements"] += 1
+        counts["rows"] += max(cursor.rowcount, 0)
+
+    event.listen(engine.sync_engine, "after_cursor_execute", count)
+    results = {}
+    try:
+        for name, scenario in SCENARIOS:
+            counts.update(statements=0, rows=0)
+            async with async_session_maker() as session:
+                try:
+                    await scenario(session, ctx)
+                except Exception as e:
+                    print(f"{name}: {e!r}")
+            results[name] = dict(counts)
+    finally:
+        event.remove(engine.sync_engine, "after_cursor_execute", count)
+        await engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--token", help="auth session token (jti) whose user runs the endpoints")
+    parser.add_argument("--eager", action="store_true", help="load every relationship with selectin")
+    parser.add_argument("--save", help="write the counts to a JSON file")
+    parser.add_argument("--compare", help="JSON file saved by an earlier run")
+    args = parser.parse_args()
+
+    if args.eager:
+        use_selectin_everywhere()
+
+    async def run():
+        return await count_queries(await load_context(args.token))
+
+    results = asyncio.run(run())
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    print(f"{'endpoint':<28} {'statements':>12} {'rows':>12}")
+    for name, counts in results.items():
+        line = f"{name:<28} {counts['statements']:>12} {counts['rows']:>12}"
+        if name in baseline:
+            line += f"   was {baseline[name]['statements']} statements, {baseline[name]['rows']} rows"
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+Query plan checks for the hot query functions.
+
+    python -m app.query_plans
+
+Every check in CHECKS is run against the configured database inside a transaction
+that is rolled back at the end. The SQL it sends is captured and EXPLAINed with
+sequential scans disabled: the planner then only picks a Seq Scan when no index can
+serve the query, so a missing index shows up on an empty database as well as on a
+seeded one. A plan, a company and a channel are inserted first in the same transaction,
+so the checks that write (usage counters) have rows to point at. Exits with 1 when a
+Seq Scan on one of LARGE_TABLES is found or a check fails.
+"""
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import event, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.ai import queries as ai_queries
+from app.auth import queries as auth_queries
+from app.billing import queries as billing_queries
+from app.billing.services.rate_limit import check_source_rate_limit
+from app.billing.services.usage import check_and_consume_usage
+from app.billing.models import Plan
+from app.channels import queries as channel_queries
+from app.channels.models import Channel
+from app.database import engine
+from app.posts import queries as post_queries
+from app.users import queries as user_queries
+from app.users.models import Company
+
+LARGE_TABLES = {
+    "posts",
+    "channel_logs",
+    "usages",
+    "auth_sessions",
+    "sources",
+    "scheduled_ai_posts",
+    "channels",
+    "usage_counters",
+    "payments",
+}
+
+# replaced by the ids of the rows seeded in the rolled back transaction
+COMPANY_ID = 1
+CHANNEL_ID = 1
+AFTER = (datetime(2025, 1, 1), 1000)
+
+
+def _now() -> datetime:
+    return datetime.now(tz=timezone.utc).replace(tzinfo=None)
+
+
+CHECKS: List[Tuple[str, Callable[[AsyncSession], Awaitable]]] = [
+    ("posts.get_post_query", lambda session: post_queries.get_post_query(
+        post_id=1, company_id=COMPANY_ID, session=session)),
+    ("posts.get_posts_query", lambda session: post_queries.get_posts_query(
+        company_id=COMPANY_ID, channel_id=CHANNEL_ID, page=2, limit=10, session=session)),
+    ("posts.get_posts_query after cursor", lambda session: post_queries.get_posts_query(
+        company_id=COMPANY_ID, channel_id=CHANNEL_ID, page=1, limit=10, session=session, after=AFTER, with_total=False)),
+    ("posts.claim_due_posts_query", lambda session: post_queries.claim_due_posts_query(
+        end_date=_now(), limit=100, stale_before=_now() - timedelta(minutes=10), session=session,
+        options=post_queries.POST_FOR_DELIVERY)),
+    ("posts.get_last_posts_query", lambda session: post_queries.get_last_posts_query(
+        company_id=COMPANY_ID, limit=5, session=session)),
+    ("posts.get_all_posts_count_query", lambda session: post_queries.get_all_posts_count_query(
+        company_id=COMPANY_ID, session=session)),
+    ("posts.get_all_posts_ai_generated_count_query", lambda session: post_queries.get_all_posts_ai_generated_count_query(
+        company_id=COMPANY_ID, session=session)),
+    ("users.get_dashboard_query", lambda session: user_queries.get_dashboard_query(
+        company_id=COMPANY_ID, limit=10, session=session)),
+    ("channels.get_channels_query", lambda session: channel_queries.get_channels_query(
+        company_id=COMPANY_ID, page=1, limit=10, session=session)),
+    ("channels.get_channel_logs_query", lambda session: channel_queries.get_channel_logs_query(
+        channel_id=CHANNEL_ID, page=2, limit=10, session=session)),
+    ("channels.get_channel_logs_query after cursor", lambda session: channel_queries.get_channel_logs_query(
+        channel_id=CHANNEL_ID, page=1, limit=10, session=session, after=AFTER, with_total=False)),
+    ("channels.get_count_all_channels_query", lambda session: channel_queries.get_count_all_channels_query(
+        company_id=COMPANY_ID, session=session)),
+    ("channels.get_last_channels_logs_query", lambda session: channel_queries.get_last_channels_logs_query(
+        company_id=COMPANY_ID, limit=5, session=session)),
+    ("ai.get_sources_query", lambda session: ai_queries.get_sources_query(
+        company_id=COMPANY_ID, channel_id=CHANNEL_ID, page=1, limit=10, session=session)),
+    ("ai.get_sources_by_content_hash_query", lambda session: ai_queries.get_sources_by_content_hash_query(
+        company_id=COMPANY_ID, content_hash="0" * 64, session=session)),
+    ("ai.get_scheduled_ai_posts_query", lambda session: ai_queries.get_scheduled_ai_posts_query(
+        company_id=COMPANY_ID, channel_id=CHANNEL_ID, session=session)),
+    ("ai.claim_due_scheduled_ai_posts_query", lambda session: ai_queries.claim_due_scheduled_ai_posts_query(
+        now=datetime.now(tz=timezone.utc), limit=100, session=session)),
+    ("auth.get_auth_session", lambda session: auth_queries.get_auth_session(
+        token="token", session=session, options=auth_queries.AUTH_SESSION_WITH_USER)),
+    ("billing.get_payments_query", lambda session: billing_queries.get_payments_query(
+        company_id=COMPANY_ID, page=1, limit=10, session=session, after=AFTER)),
+    ("billing.get_usages_by_company_id_timeframe_query", lambda session: billing_queries.get_usages_by_company_id_timeframe_query(
+        company_id=COMPANY_ID, start_date=_now() - timedelta(days=30), end_date=_now(), session=session)),
+    ("billing.check_source_rate_limit", lambda session: check_source_rate_limit(
+        db=session, channel=SimpleNamespace(id=CHANNEL_ID), plan=SimpleNamespace(knowledge_base_limit=1), raise_exception=False)),
+    ("billing.check_and_consume_usage", lambda session: check_and_consume_usage(
+        db=session, company=SimpleNamespace(id=COMPANY_ID, last_payment_at=_now(), current_plan=SimpleNamespace(send_post_limit=1)),
+        action="post", raise_exception=False)),
+]
+
+
+async def seed(conn):
+    """
+    Minimal plan, company and channel rows for the checks, rolled back with the rest.
+    """
+    global COMPANY_ID, CHANNEL_ID
+    plan_id = (await conn.execute(insert(Plan).values(
+        name="query plans", price=0, send_post_limit=1, ai_generation_limit=1, channels_limit=1,
+    ).returning(Plan.id))).scalar()
+    COMPANY_ID = (await conn.execute(insert(Company).values(
+        name="query plans", current_plan_id=plan_id,
+    ).returning(Company.id))).scalar()
+    CHANNEL_ID = (await conn.execute(insert(Channel).values(
+        company_id=COMPANY_ID, channel_type="api", config_json={},
+    ).returning(Channel.id))).scalar()
+
+
+def seq_scans(plan: dict) -> List[str]:
+    """
+    Relations read with a Seq Scan anywhere in an EXPLAIN (FORMAT JSON) plan.
+    """
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def check_plans() -> List[str]:
+    captured = []
+    capturing = False
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    failures = []
+    try:
+        async with engine.connect() as conn:
+            transaction = await conn.begin()
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            await seed(conn)
+            session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+            for name, check in CHECKS:
+                captured.clear()
+                capturing = True
+                try:
+                    await check(session)
+                except Exception as e:
+                    # back to the savepoint, the statements sent before the error are still explained
+                    await session.rollback()
+                    print(f"{name}: ERROR {e!r}")
+                    failures.append(f"{name}: failed with {type(e).__name__}")
+                finally:
+                    capturing = False
+                for statement, parameters in captured:
+                    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                    plan = result.scalar()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    tables = sorted(set(seq_scans(plan[0]["Plan"])) & LARGE_TABLES)
+                    status = f"SEQ SCAN on {', '.join(tables)}" if tables else "ok"
+                    print(f"{name}: {status}\n    {' '.join(statement.split())[:160]}")
+                    if tables:
+                        failures.append(f"{name}: {', '.join(tables)}")
+            await session.close()
+            await transaction.rollback()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        await engine.dispose()
+    return failures
+
+
+def main():
+    failures = asyncio.run(check_plans())
+    if failures:
+        print(f"\n{len(failures)} queries failed or scan large tables sequentially:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print(f"\nAll {len(CHECKS)} checks use indexes.")
+
+
+if __name__ == "__main__":
+    main()
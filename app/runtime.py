@@ -0,0 +1,75 @@
+import asyncio
+import functools
+
+from celery.signals import worker_process_init, worker_process_shutdown
+from celery.utils.log import get_task_logger
+
+from app.cache import close_redis
+from app.elastic import close_es
+from app.http_client import close_clients, log_pool_stats
+from app.database import engine
+
+logger = get_task_logger(__name__)
+
+# One event loop per worker process. Everything bound to a loop (asyncpg pool,
+# shared httpx clients, async ES/OpenAI clients) is created on it and reused by all tasks.
+_loop: asyncio.AbstractEventLoop = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+def run(coro):
+    """
+    Run a coroutine to completion on the worker event loop.
+    """
+    try:
+        return get_loop().run_until_complete(coro)
+    finally:
+        # the loop only runs inside tasks, so the stats are logged from here
+        log_pool_stats(logger.info)
+
+
+def async_task(func):
+    """
+    Turn a coroutine function into a sync callable for `celery_app.task`.
+
+    Usage:
+        @celery_app.task
+        @async_task
+        async def my_task(...): ...
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run(func(*args, **kwargs))
+
+    return wrapper
+
+
+async def shutdown():
+    await close_clients()
+    await close_redis()
+    await close_es()
+    await engine.dispose()
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # pooled connections inherited from the parent process must not be reused after fork
+    engine.sync_engine.dispose(close=False)
+    get_loop()
+    logger.info("Async runtime started")
+
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    if _loop is None or _loop.is_closed():
+        return
+    run(shutdown())
+    _loop.close()
+    logger.info("Async runtime stopped")
@@ -0,0 +1,122 @@
+"""
+Per-task overhead of the Celery async runtime against the old way of running tasks.
+
+    python -m app.runtime_benchmark [--tasks N] [--url URL] [--redis] [--db]
+
+Every task does one HTTP request and, with --redis / --db, one Redis PING and one
+SELECT 1. "per call" is what the tasks did before app.runtime: a fresh event loop
+per task, with a new HTTP client, Redis client and database connection opened and
+closed in it. "runtime" runs the same work through `runtime.run` on the worker
+loop with the shared clients and the engine pool. Without --url a local HTTP
+server is started, so the benchmark runs without any service.
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+import httpx
+import redis.asyncio as aioredis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app import config, runtime
+from app.cache import get_redis
+from app.database import DATABASE_URL, engine
+from app.http_client import get_client
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, as the provider APIs
+    # headers and body in one segment, or delayed ACKs add 40 ms to every request
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_local_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+async def per_call_task(args):
+    async with httpx.AsyncClient() as client:
+        await client.get(args.url)
+    if args.redis:
+        client = aioredis.Redis.from_url(config.REDIS_URL)
+        try:
+            await client.ping()
+        finally:
+            await client.aclose()
+    if args.db:
+        task_engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+        try:
+            async with task_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+        finally:
+            await task_engine.dispose()
+
+
+async def runtime_task(args):
+    await get_client().get(args.url)
+    if args.redis:
+        await get_redis().ping()
+    if args.db:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+
+def measure(run_task: Callable[[], None], tasks: int) -> Dict[str, float]:
+    durations: List[float] = []
+    for _ in range(tasks):
+        start = time.perf_counter()
+        run_task()
+        durations.append(time.perf_counter() - start)
+    # the first task of each mode pays for imports and pool warm-up
+    steady = durations[1:] or durations
+    return {
+        "first": durations[0],
+        "p50": statistics.median(steady),
+        "mean": statistics.mean(steady),
+        "total": sum(durations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=200, help="tasks run per mode")
+    parser.add_argument("--url", help="URL requested by every task, a local server by default")
+    parser.add_argument("--redis", action="store_true", help="also PING REDIS_URL in every task")
+    parser.add_argument("--db", action="store_true", help="also run SELECT 1 on the database in every task")
+    args = parser.parse_args()
+    args.url = args.url or start_local_server()
+
+    results = {
+        "per call": measure(lambda: asyncio.run(per_call_task(args)), args.tasks),
+        "runtime": measure(lambda: runtime.run(runtime_task(args)), args.tasks),
+    }
+    runtime.run(runtime.shutdown())
+
+    print(f"{'mode':<10} {'first ms':>9} {'p50 ms':>8} {'mean ms':>8} {'total s':>8}")
+    for mode, r in results.items():
+        print(f"{mode:<10} {r['first'] * 1000:>9.1f} {r['p50'] * 1000:>8.2f} {r['mean'] * 1000:>8.2f} {r['total']:>8.2f}")
+    speedup = results["per call"]["mean"] / results["runtime"]["mean"] if results["runtime"]["mean"] else 0.0
+    print(f"runtime is {speedup:.1f}x faster per task")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from greenlet import getcurrent
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from app import config
+from app.database import engine
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class SQLStats:
+    """
+    Statements sent to the database while a request (or any tracked block) runs.
+    """
+
+    def __init__(self):
+        self.statements = 0
+        self.duration = 0.0  # seconds
+        self.slowest_duration = 0.0
+        self.slowest_statement = None
+        self.shapes = Counter()
+        self.repeated = {}  # shape -> call site, for shapes over SQL_N_PLUS_ONE_THRESHOLD
+
+    def record(self, statement: str, duration: float):
+        self.statements += 1
+        self.duration += duration
+        if duration >= self.slowest_duration:
+            self.slowest_duration = duration
+            self.slowest_statement = statement
+
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.shapes[shape] == config.SQL_N_PLUS_ONE_THRESHOLD + 1:
+            # the stack of the repeat that crosses the threshold points at the loop
+            self.repeated[shape] = call_site()
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.duration * 1000:.1f};desc="{self.statements} statements", '
+            f"db-slowest;dur={self.slowest_duration * 1000:.1f}"
+        )
+
+
+_stats: ContextVar[Optional[SQLStats]] = ContextVar("sql_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """
+    Statement text with parameter placeholders and expanded IN lists collapsed.
+    """
+    shape = re.sub(r"\$\d+|%\(\w+\)s|\?", "?", statement)
+    shape = re.sub(r"\?(?:\s*,\s*\?)+", "?", shape)
+    return " ".join(shape.split())
+
+
+def call_site(depth: int = 3) -> str:
+    """
+    Innermost application frames outside this module,
+    e.g. "app/posts/queries.py:60 in get_post_query <- app/users/router.py:83 in dashboard_api".
+    """
+    stacks = [traceback.extract_stack()]
+    # with the asyncio extension the statement runs in a greenlet, the awaiting code is in its parent
+    parent = getcurrent().parent
+    if parent is not None and parent.gr_frame is not None:
+        stacks.append(traceback.extract_stack(parent.gr_frame))
+    sites = []
+    for stack in stacks:
+        for frame in reversed(stack):
+            filename = os.path.abspath(frame.filename)
+            if filename.startswith(_APP_DIR) and filename != _THIS_FILE:
+                sites.append(f"{os.path.relpath(filename, os.path.dirname(_APP_DIR))}:{frame.lineno} in {frame.name}")
+    return " <- ".join(sites[:depth]) or "unknown"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _stats.get() is not None:
+        conn.info.setdefault("sql_metrics_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _stats.get()
+    if stats is not None and conn.info.get("sql_metrics_start"):
+        stats.record(statement, time.perf_counter() - conn.info["sql_metrics_start"].pop())
+
+
+def _handle_error(exception_context):
+    # a failed statement has no after_cursor_execute, drop its start time
+    starts = exception_context.connection.info.get("sql_metrics_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+event.listen(engine.sync_engine, "handle_error", _handle_error)
+
+
+@contextmanager
+def track_sql():
+    """
+    Collect SQLStats for the statements executed inside the block, in this context.
+    """
+    stats = SQLStats()
+    token = _stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _stats.reset(token)
+
+
+def report(stats: SQLStats, label: str):
+    for shape, site in stats.repeated.items():
+        print(f"SQL N+1 {label}: {stats.shapes[shape]} x {shape[:200]} at {site}")
+    if config.SQL_METRICS_LOG and stats.statements:
+        slowest = " ".join((stats.slowest_statement or "").split())[:200]
+        print(
+            f"SQL {label}: {stats.statements} statements, {stats.duration * 1000:.1f} ms, "
+            f"slowest {stats.slowest_duration * 1000:.1f} ms: {slowest}"
+        )
+
+
+class SQLMetricsMiddleware:
+    """
+    Count statements and database time per request, add them as a Server-Timing header
+    and log them. Statements executed after the response started (streaming bodies,
+    background tasks) are only in the log.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        with track_sql() as stats:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                report(stats, f"{scope['method']} {scope['path']}")
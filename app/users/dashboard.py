@@ -0,0 +1,40 @@
+import json
+
+from sqlalchemy.ext.asyncio.session import AsyncSession
+
+from app import config
+from app.cache import get_redis
+from app.users import queries as user_queries
+
+
+def _key(company_id: int) -> str:
+    return f"dashboard:{company_id}"
+
+
+async def get_dashboard(company_id: int, session: AsyncSession, limit: int = 10) -> dict:
+    """
+    Dashboard of a company, cached in Redis for DASHBOARD_CACHE_TTL seconds.
+    """
+    redis = get_redis()
+    try:
+        data = await redis.get(_key(company_id))
+        if data is not None:
+            return json.loads(data)
+    except Exception as e:
+        print(f"Dashboard cache unavailable: {e}")
+
+    dashboard = await user_queries.get_dashboard_query(company_id=company_id, limit=limit, session=session)
+    if dashboard is None:
+        return None
+    try:
+        await redis.set(_key(company_id), json.dumps(dashboard, default=str), ex=config.DASHBOARD_CACHE_TTL)
+    except Exception as e:
+        print(f"Dashboard cache unavailable: {e}")
+    return dashboard
+
+
+async def invalidate_dashboard(company_id: int):
+    try:
+        await get_redis().delete(_key(company_id))
+    except Exception as e:
+        print(f"Dashboard cache unavailable, {company_id} not invalidated: {e}")
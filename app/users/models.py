@@ -27,16 +27,16 @@ class Company(Base):
     subscription_valid_until: Mapped[Optional[datetime]] = mapped_column(DateTime(), nullable=True)
     payment_service: Mapped[str] = mapped_column(String, nullable=True)  # "stripe", "paypal", etc.
 
-    users: Mapped["User"] = relationship(back_populates="company", lazy="selectin")
-    channels: Mapped["Channel"] = relationship(back_populates="company", lazy="selectin")
-    sources: Mapped["Source"] = relationship(back_populates="company", lazy="selectin")
-    current_plan: Mapped["Plan"] = relationship(back_populates="companies", lazy="selectin")
-    referrals: Mapped["Referral"] = relationship("Referral", back_populates="referrer", lazy="selectin",
+    users: Mapped["User"] = relationship(back_populates="company", lazy="raise", passive_deletes=True)
+    channels: Mapped["Channel"] = relationship(back_populates="company", lazy="raise", passive_deletes=True)
+    sources: Mapped["Source"] = relationship(back_populates="company", lazy="raise", passive_deletes=True)
+    current_plan: Mapped["Plan"] = relationship(back_populates="companies", lazy="raise")
+    referrals: Mapped["Referral"] = relationship("Referral", back_populates="referrer", lazy="raise", passive_deletes=True,
                                                  foreign_keys="Referral.referrer_id")
-    referred: Mapped["Referral"] = relationship("Referral", back_populates="referred", lazy="selectin",
+    referred: Mapped["Referral"] = relationship("Referral", back_populates="referred", lazy="raise", passive_deletes=True,
                                                 foreign_keys="Referral.referred_id")
-    usages: Mapped["Usage"] = relationship("Usage", back_populates="company", lazy="selectin")
-    payments: Mapped["Payment"] = relationship("Payment", back_populates="company", lazy="selectin")
+    usages: Mapped["Usage"] = relationship("Usage", back_populates="company", lazy="raise", passive_deletes=True)
+    payments: Mapped["Payment"] = relationship("Payment", back_populates="company", lazy="raise", passive_deletes=True)
 
     def __repr__(self) -> str:
         return f"<Company(id={self.id}, name={self.name}, created_at={self.created_at})>"
@@ -57,10 +57,10 @@ class User(Base):
     last_login: Mapped[datetime] = mapped_column(DateTime(), nullable=True)
 
     settings: Mapped["UserSetting"] = relationship(
-        back_populates="user", lazy="selectin"
+        back_populates="user", lazy="raise", passive_deletes=True
     )
-    auth_session: Mapped["AuthSession"] = relationship(back_populates="user")
-    company = relationship("Company", back_populates="users", lazy="selectin")
+    auth_session: Mapped["AuthSession"] = relationship(back_populates="user", lazy="raise", passive_deletes=True)
+    company = relationship("Company", back_populates="users", lazy="raise")
 
 
 class UserSetting(Base):
@@ -69,5 +69,5 @@ class UserSetting(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     timezone: Mapped[str] = mapped_column(nullable=True, server_default="UTC")
-    user: Mapped["User"] = relationship(back_populates="settings")
+    user: Mapped["User"] = relationship(back_populates="settings", lazy="raise")
 
@@ -1,11 +1,54 @@
 import traceback
+from typing import List
 
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from app.auth.models import AuthSession
-from sqlalchemy import select, insert, delete, update
+from sqlalchemy import select, insert, delete, update, text, JSON, Integer
 
 from app.users.models import User, UserSetting, Company
 
+# Counts and the newest channels, posts and logs of a company in one round trip.
+# Post counts come from one index-only scan of ix_posts_company_id_created_at,
+# per-channel counts from ix_posts_channel_id_created_at_id.
+DASHBOARD_SQL = text("""
+WITH last_channels AS (
+    SELECT c.*, (SELECT count(*) FROM posts p WHERE p.channel_id = c.id) AS posts_count
+    FROM channels c
+    WHERE c.company_id = :company_id
+    ORDER BY c.created_at DESC, c.id DESC
+    LIMIT :limit
+), last_posts AS (
+    SELECT * FROM posts
+    WHERE company_id = :company_id
+    ORDER BY created_at DESC
+    LIMIT :limit
+), last_channel_logs AS (
+    SELECT * FROM channel_logs
+    WHERE channel_id IN (SELECT id FROM channels WHERE company_id = :company_id)
+    ORDER BY created_at DESC
+    LIMIT :limit
+), post_counts AS (
+    SELECT count(*) AS all_posts_count, count(*) FILTER (WHERE ai_generated) AS all_ai_generated_posts_count
+    FROM posts
+    WHERE company_id = :company_id
+)
+SELECT
+    (SELECT count(*) FROM channels WHERE company_id = :company_id) AS all_channels_count,
+    post_counts.all_posts_count,
+    post_counts.all_ai_generated_posts_count,
+    (SELECT coalesce(json_agg(c ORDER BY c.created_at DESC, c.id DESC), '[]') FROM last_channels c) AS last_channels,
+    (SELECT coalesce(json_agg(p ORDER BY p.created_at DESC), '[]') FROM last_posts p) AS last_posts,
+    (SELECT coalesce(json_agg(l ORDER BY l.created_at DESC), '[]') FROM last_channel_logs l) AS last_channel_logs
+FROM post_counts
+""").columns(
+    all_channels_count=Integer,
+    all_posts_count=Integer,
+    all_ai_generated_posts_count=Integer,
+    last_channels=JSON,
+    last_posts=JSON,
+    last_channel_logs=JSON,
+)
+
 
 async def create_user(data: dict, session: AsyncSession) -> User:
     try:
@@ -82,3 +125,23 @@ async def get_company_by_referral_code_query(
     except Exception as e:
         print(f"Error getting company by referral code - {referral_code}")
         traceback.print_exc()
+
+
+async def get_company_ids_by_plan_query(plan_id: int, session: AsyncSession) -> List[int]:
+    try:
+        stmt = select(Company.id).where(Company.current_plan_id == plan_id)
+        result = await session.execute(stmt)
+        return list(result.scalars().all())
+    except Exception as e:
+        print(f"Error getting companies by plan - {plan_id}")
+        traceback.print_exc()
+        return []
+
+
+async def get_dashboard_query(company_id: int, limit: int, session: AsyncSession) -> dict:
+    try:
+        result = await session.execute(DASHBOARD_SQL, {"company_id": company_id, "limit": limit})
+        return dict(result.mappings().one())
+    except Exception as e:
+        traceback.print_exc()
+        return None